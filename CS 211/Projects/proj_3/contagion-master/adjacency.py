@@ -0,0 +1,204 @@
+"""Neighbor tables for a whole population.
+
+Each individual has a short list of neighbors it may visit.
+Rather than one Python list per individual we keep them all in
+one compressed sparse row (CSR) table:  cells are numbered
+row * ncols + col, and the neighbors of cell i are
+index[start[i]:start[i+1]].
+
+Neighbors on a grid are chosen for every cell in one pass:
+for each visiting distance we precompute the table of offsets
+within that distance, then choose among the in-bounds offsets
+for a block of cells at a time with array operations.  Tables
+for other contact networks are built from their edges
+(from_edges).
+"""
+
+import profiling
+
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+# Roughly how many candidate neighbors to consider at once;
+# bounds the memory used while building a table
+BLOCK = 2 ** 20
+
+
+class Adjacency:
+    """Neighbors of every cell, in CSR form"""
+
+    def __init__(self, start: np.ndarray, index: np.ndarray):
+        self.start = start
+        self.index = index
+
+    def __len__(self) -> int:
+        return self.start.size - 1
+
+    def of(self, i: int) -> np.ndarray:
+        """Neighbors of cell i"""
+        return self.index[self.start[i]:self.start[i + 1]]
+
+    def degree(self, cells: np.ndarray) -> np.ndarray:
+        """Number of neighbors of each of cells"""
+        return self.start[cells + 1] - self.start[cells]
+
+    def max_degree(self) -> int:
+        return int(np.diff(self.start).max(initial=0))
+
+    def contains(self, cells: np.ndarray, others: np.ndarray) -> np.ndarray:
+        """Elementwise: is others[i] one of the neighbors of cells[i]?"""
+        start = self.start[cells]
+        degree = self.start[cells + 1] - start
+        found = np.zeros(cells.size, dtype=bool)
+        for j in range(self.max_degree()):
+            has = degree > j
+            found |= has & (self.index[np.where(has, start + j, 0)] == others)
+        return found
+
+
+@lru_cache(maxsize=None)
+def offset_table(dist: int) -> np.ndarray:
+    """(row, col) steps to every address at most dist away in
+    each direction, except the cell itself.  Shape (k, 2).
+    """
+    steps = np.arange(-dist, dist + 1)
+    rows = np.repeat(steps, steps.size)
+    cols = np.tile(steps, steps.size)
+    not_self = (rows != 0) | (cols != 0)
+    table = np.stack([rows[not_self], cols[not_self]], axis=1)
+    table.flags.writeable = False
+    return table
+
+
+def _in_bounds_count(pos: np.ndarray, dist: int, size: int) -> np.ndarray:
+    """How many of pos-dist .. pos+dist lie in 0 .. size-1"""
+    return np.minimum(pos + dist, size - 1) - np.maximum(pos - dist, 0) + 1
+
+
+def grid_adjacency(nrows: int, ncols: int,
+                   num: np.ndarray, dist: np.ndarray,
+                   rng: np.random.Generator) -> Adjacency:
+    """Choose up to num[i] distinct neighbors for each cell i,
+    at most dist[i] away in each direction (not the cell itself).
+    A cell near an edge gets fewer if fewer are available.
+    """
+    with profiling.phase("build.neighbors"):
+        n = nrows * ncols
+        num = np.broadcast_to(num, n)
+        dist = np.broadcast_to(dist, n)
+        start = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(neighbor_counts(nrows, ncols, 0, n, num, dist), out=start[1:])
+        index = np.empty(start[-1], dtype=index_dtype(n))
+        choose_neighbors(nrows, ncols, 0, n, num, dist, start, index, rng)
+        return Adjacency(start, index)
+
+
+def index_dtype(n: int) -> np.dtype:
+    """Small enough integers to number n cells"""
+    return np.dtype(np.int32 if n < 2 ** 31 else np.int64)
+
+
+def neighbor_counts(nrows: int, ncols: int, lo: int, hi: int,
+                    num: np.ndarray, dist: np.ndarray) -> np.ndarray:
+    """How many neighbors cells lo..hi-1 get, given num and dist
+    for those cells:  num, or fewer near an edge
+    """
+    rows, cols = np.divmod(np.arange(lo, hi), ncols)
+    available = (_in_bounds_count(rows, dist, nrows)
+                 * _in_bounds_count(cols, dist, ncols) - 1)
+    return np.minimum(num, available)
+
+
+def choose_neighbors(nrows: int, ncols: int, lo: int, hi: int,
+                     num: np.ndarray, dist: np.ndarray,
+                     start: np.ndarray, index: np.ndarray,
+                     rng: np.random.Generator):
+    """Fill in index[start[lo]:start[hi]], the neighbors of cells
+    lo..hi-1, given num and dist for those cells.  start must
+    already be filled in (see neighbor_counts), so a big table can
+    be built a range of cells at a time.
+    """
+    rows, cols = np.divmod(np.arange(lo, hi), ncols)
+    degree = np.diff(start[lo:hi + 1])
+    # Cells sharing the same (num, dist) share an offset table
+    pairs = num.astype(np.int64) * (int(dist.max(initial=0)) + 1) + dist
+    groups, group_of = np.unique(pairs, return_inverse=True)
+    for members in _members(group_of, groups.size):
+        group_num, group_dist = int(num[members[0]]), int(dist[members[0]])
+        offsets = offset_table(group_dist)
+        if len(offsets) == 0:
+            continue    # Visit_Dist 0:  nobody to visit
+        log.debug(f"{members.size} cells choose {group_num} "
+                  f"of {len(offsets)} offsets")
+        block = max(1, BLOCK // len(offsets))
+        for first in range(0, members.size, block):
+            cells = members[first:first + block]
+            _choose(lo + cells, rows[cells], cols[cells], degree[cells],
+                    start, index, offsets, nrows, ncols, rng)
+
+
+def _members(group_of: np.ndarray, n_groups: int) -> List[np.ndarray]:
+    """Indices of the cells in each group, in increasing order"""
+    order = np.argsort(group_of, kind="stable")
+    bounds = np.searchsorted(group_of[order], np.arange(n_groups + 1))
+    return [order[bounds[g]:bounds[g + 1]] for g in range(n_groups)]
+
+
+def _choose(cells: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+            degree: np.ndarray, start: np.ndarray, index: np.ndarray,
+            offsets: np.ndarray, nrows: int, ncols: int,
+            rng: np.random.Generator):
+    """Fill in the neighbors of a block of cells that share offsets.
+    Each cell gives every candidate a random key; out-of-bounds
+    candidates get a key that always loses, and the cell takes the
+    candidates with the smallest keys.  That is a uniform choice
+    without replacement among the in-bounds candidates.
+    """
+    cand_rows = rows[:, None] + offsets[:, 0]
+    cand_cols = cols[:, None] + offsets[:, 1]
+    valid = ((cand_rows >= 0) & (cand_rows < nrows)
+             & (cand_cols >= 0) & (cand_cols < ncols))
+    keys = rng.random(cand_rows.shape, dtype=np.float32)
+    keys[~valid] = 2.0
+    width = int(degree.max(initial=0))
+    if width == 0:
+        return
+    if width < offsets.shape[0]:
+        picks = np.argpartition(keys, width - 1, axis=1)[:, :width]
+    else:
+        picks = np.broadcast_to(np.arange(width), keys.shape)
+    chosen = (np.take_along_axis(cand_rows, picks, axis=1) * ncols
+              + np.take_along_axis(cand_cols, picks, axis=1))
+    # Exactly degree[i] of the picks in row i are in bounds
+    taken = np.take_along_axis(valid, picks, axis=1)
+    slots = start[cells][:, None] + np.cumsum(taken, axis=1) - 1
+    index[slots[taken]] = chosen[taken]
+
+
+def from_edges(src: np.ndarray, dst: np.ndarray, n: int,
+               directed: bool = False) -> Adjacency:
+    """Table for a network of n cells with an edge from src[i] to
+    dst[i] for each i (both ways unless directed).  Self loops and
+    repeated edges are dropped; each cell's neighbors are in order.
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    if not directed:
+        src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+    keep = src != dst
+    # Sort by (src, dst) as one key, and drop repeats
+    keys = np.unique(src[keep] * n + dst[keep])
+    start = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // n, minlength=n), out=start[1:])
+    return Adjacency(start, (keys % n).astype(index_dtype(n)))
+
+
+def addresses(adjacency: Adjacency, i: int, ncols: int) -> List[Tuple[int, int]]:
+    """Neighbors of cell i as (row, col) addresses"""
+    return [divmod(j, ncols) for j in adjacency.of(i).tolist()]
@@ -0,0 +1,334 @@
+"""Array-backed population for large grids.
+
+Same model as model.Population, but instead of one Individual
+object per cell we keep health state, time in state, kind and
+neighbor addresses (see adjacency.py) in NumPy arrays, one entry per cell (numbered
+row * ncols + col).  A step is a handful of whole-array operations
+rather than two Python-level passes over every cell.
+
+Views that expect to attach listeners to population.cells[row][col]
+still work: the cells are lightweight Cell objects that read their
+state from the arrays and are notified only when it changes.
+"""
+
+import mvc
+import config
+import adjacency
+import profiling
+import model
+from model import Health, Params, Seed, seed_sequence
+
+import numpy as np
+from typing import Dict, List, Tuple
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+# Kinds of individual, with the same codes as in model.Population
+KINDS = [the_class.__name__ for the_class in model.KINDS]
+AT_RISK = KINDS.index("AtRisk")
+
+# Health states are stored as their enum values
+VULNERABLE = Health.vulnerable.value
+ASYMPTOMATIC = Health.asymptomatic.value
+SYMPTOMATIC = Health.symptomatic.value
+RECOVERED = Health.recovered.value
+DEAD = Health.dead.value
+# Room for every state value, as an array index
+STATES = len(Health) + 1
+
+
+class Cell(mvc.Listenable):
+    """Stand-in for an Individual at one address of an
+    ArrayPopulation.  The 'state' is public read-only, like
+    Individual.state, so the same listeners can use it.
+    """
+
+    def __init__(self, region: "ArrayPopulation", row: int, col: int):
+        super().__init__()
+        self.region = region
+        self.row = row
+        self.col = col
+
+    @property
+    def state(self) -> Health:
+        return self.region.state_at(self.row, self.col)
+
+    @property
+    def kind(self) -> str:
+        return KINDS[self.region.kind[self.row * self.region.ncols + self.col]]
+
+
+class ArrayPopulation(mvc.Listenable):
+    """Drop-in alternative to model.Population for big grids"""
+
+    def __init__(self, nrows: int, ncols: int, seed: Seed = None):
+        super().__init__()
+        self.nrows = nrows
+        self.ncols = ncols
+        self.day = 0
+        self.seed_sequence = seed_sequence(seed)
+        self.rng = np.random.default_rng(self.seed_sequence)
+        self._set_params([Params.from_config(kind) for kind in KINDS])
+        n = nrows * ncols
+        kind = self.rng.choice(len(KINDS), size=n, p=_kind_weights()).astype(np.int8)
+        table = adjacency.grid_adjacency(nrows, ncols,
+                                         self.N_Neighbors[kind],
+                                         self.Visit_Dist[kind],
+                                         self.rng)
+        self._set_arrays(kind=kind,
+                         state=np.full(n, VULNERABLE, dtype=np.int8),
+                         time_in_state=np.zeros(n, dtype=np.int32),
+                         prior_visit=np.full(n, -1, dtype=np.int32),
+                         table=table)
+
+    def _set_params(self, params: List[Params]):
+        """Per-kind parameters, as arrays indexed by kind code"""
+        self.params = params
+        self.T_Incubate = np.array([p.T_Incubate for p in params])
+        self.P_Transmit = np.array([p.P_Transmit for p in params])
+        self.T_Recover = np.array([p.T_Recover for p in params])
+        self.P_Death = np.array([p.P_Death for p in params])
+        self.N_Neighbors = np.array([p.N_Neighbors for p in params])
+        self.P_Visit = np.array([p.P_Visit for p in params])
+        self.Visit_Dist = np.array([p.Visit_Dist for p in params])
+
+    def _set_arrays(self, kind: np.ndarray, state: np.ndarray,
+                    time_in_state: np.ndarray, prior_visit: np.ndarray,
+                    table: adjacency.Adjacency):
+        """Per-cell state"""
+        self.kind = kind
+        self.state = state
+        self.time_in_state = time_in_state
+        self.prior_visit = prior_visit
+        self.adjacency = table
+        # Scratch space for a step
+        self.next_state = np.array(state)
+        self.infected = np.zeros(state.size, dtype=bool)
+        self._recount()
+        self._cells = None
+        # Cells that changed state in the last step, for
+        # listeners to the "changes" event
+        self.last_changes = np.zeros(0, dtype=np.intp)
+
+    def _recount(self):
+        """Live count of cells of each kind in each state, indexed
+        by kind code and state value, and the totals over kinds
+        """
+        self._kind_counts = np.bincount(
+            _kind_state(self.kind, self.state), minlength=len(KINDS) * STATES
+        ).reshape(len(KINDS), STATES)
+        self._counts = self._kind_counts.sum(axis=0)
+
+    def checkpoint_state(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """Everything needed to pick up where we left off (see checkpoint.py):
+        fields that go in the header, and the per-cell arrays.
+        """
+        fields = {"nrows": self.nrows, "ncols": self.ncols, "day": self.day,
+                  "seed": [self.seed_sequence.entropy, list(self.seed_sequence.spawn_key)],
+                  "params": [p._asdict() for p in self.params],
+                  "rng": self.rng.bit_generator.state}
+        arrays = {"kind": self.kind, "state": self.state,
+                  "time_in_state": self.time_in_state,
+                  "prior_visit": self.prior_visit,
+                  "start": self.adjacency.start, "index": self.adjacency.index}
+        return fields, arrays
+
+    @classmethod
+    def from_checkpoint(cls, fields: dict, arrays: Dict[str, np.ndarray]
+                        ) -> "ArrayPopulation":
+        """Population as it was when checkpoint_state was called"""
+        population = cls.__new__(cls)
+        mvc.Listenable.__init__(population)
+        population.nrows = fields["nrows"]
+        population.ncols = fields["ncols"]
+        population.day = fields["day"]
+        entropy, spawn_key = fields["seed"]
+        population.seed_sequence = np.random.SeedSequence(entropy, spawn_key=tuple(spawn_key))
+        population.rng = np.random.default_rng(population.seed_sequence)
+        population.rng.bit_generator.state = fields["rng"]
+        population._set_params([Params(**p) for p in fields["params"]])
+        population._set_arrays(kind=arrays["kind"], state=arrays["state"],
+                               time_in_state=arrays["time_in_state"],
+                               prior_visit=arrays["prior_visit"],
+                               table=adjacency.Adjacency(arrays["start"], arrays["index"]))
+        return population
+
+    @property
+    def cells(self) -> List[List[Cell]]:
+        """Listenable cells, created the first time someone asks"""
+        if self._cells is None:
+            self._cells = [[Cell(self, row, col) for col in range(self.ncols)]
+                           for row in range(self.nrows)]
+        return self._cells
+
+    def step(self):
+        """Determine next states, then time passes"""
+        log.debug("ArrayPopulation: Step")
+        n = self.state.size
+        with profiling.phase("step.decide"):
+            self._decide(0, n, self.rng)
+        with profiling.phase("step.commit"):
+            changed, was = self._commit(0, n)
+            self._tally(changed, was)
+        with profiling.phase("step.notify"):
+            self._notify(changed)
+            self.day += 1
+            self.notify_all("timestep")
+
+    def _decide(self, lo: int, hi: int, rng: np.random.Generator):
+        """Next states of cells lo..hi-1, in next_state.  Their visits
+        may infect cells outside that range; those are marked in
+        'infected' rather than next_state.  Reads only the current
+        state, so any ranges can be decided in any order.
+        """
+        state, kind = self.state, self.kind
+        here_state = state[lo:hi]
+        here_kind = kind[lo:hi]
+        here_time = self.time_in_state[lo:hi]
+        next_state = self.next_state[lo:hi]
+        next_state[:] = here_state
+
+        # Disease progression
+        incubated = (here_state == ASYMPTOMATIC) & (here_time > self.T_Incubate[here_kind])
+        next_state[incubated] = SYMPTOMATIC
+        sick = np.flatnonzero(here_state == SYMPTOMATIC)
+        recover = here_time[sick] > self.T_Recover[here_kind[sick]]
+        die = ~recover & (rng.random(sick.size) < self.P_Death[here_kind[sick]])
+        next_state[sick[recover]] = RECOVERED
+        next_state[sick[die]] = DEAD
+
+        # Social behavior: each visitor either picks a new neighbor
+        # or returns to the one they visited last time
+        visitors = lo + np.flatnonzero(rng.random(hi - lo) < self.P_Visit[here_kind])
+        hosts = self.prior_visit[visitors].astype(np.int64)
+        fresh = hosts < 0
+        new = np.flatnonzero(fresh)
+        table = self.adjacency
+        start = table.start[visitors[new]]
+        degree = table.degree(visitors[new])
+        somebody = degree > 0   # Can't visit if nobody is near
+        new, start, degree = new[somebody], start[somebody], degree[somebody]
+        hosts[new] = table.index[start + (rng.random(new.size) * degree).astype(np.int64)]
+        self.prior_visit[visitors] = np.where(fresh, hosts, -1)
+        met = hosts >= 0
+        visitors, hosts = visitors[met], hosts[met]
+        welcome = kind[hosts] != AT_RISK
+        wary = ~welcome
+        welcome[wary] = table.contains(hosts[wary], visitors[wary])
+        visitors, hosts = visitors[welcome], hosts[welcome]
+
+        # Either party of a meeting may infect the other
+        host_state, visitor_state = state[hosts], state[visitors]
+        dice = rng.random((2, visitors.size))
+        hit = (_contagious(host_state) & (visitor_state == VULNERABLE)
+               & (dice[0] < self.P_Transmit[kind[hosts]]))
+        self.infected[visitors[hit]] = True
+        hit = (_contagious(visitor_state) & (host_state == VULNERABLE)
+               & (dice[1] < self.P_Transmit[kind[visitors]]))
+        self.infected[hosts[hit]] = True
+
+    def _commit(self, lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Time passes for cells lo..hi-1:  they take their next
+        states.  Returns the cells that changed and their old states.
+        """
+        state = self.state[lo:hi]
+        next_state = self.next_state[lo:hi]
+        infected = self.infected[lo:hi]
+        next_state[infected] = ASYMPTOMATIC
+        infected[:] = False
+        time_in_state = self.time_in_state[lo:hi]
+        time_in_state += 1
+        changed = np.flatnonzero(next_state != state)
+        was = state[changed]
+        state[changed] = next_state[changed]
+        time_in_state[changed] = 0
+        return lo + changed, was
+
+    def _tally(self, changed: np.ndarray, was: np.ndarray):
+        """Update live counts after cells changed from states was"""
+        kind = self.kind[changed]
+        size = self._kind_counts.size
+        moves = (np.bincount(_kind_state(kind, self.state[changed]), minlength=size)
+                 - np.bincount(_kind_state(kind, was), minlength=size))
+        moves = moves.reshape(self._kind_counts.shape)
+        self._kind_counts += moves
+        self._counts += moves.sum(axis=0)
+
+    def _notify(self, changed: np.ndarray):
+        """One "changes" event for all the cells that changed at
+        once, then "newstate" for each of them if anyone is listening
+        to cells
+        """
+        self.last_changes = changed
+        self.notify_all("changes")
+        if self._cells is None:
+            return
+        for i in changed.tolist():
+            row, col = divmod(i, self.ncols)
+            self._cells[row][col].notify_all("newstate")
+
+    def seed(self):
+        """Patient zero"""
+        i = int(self.rng.integers(self.state.size))
+        if self.state[i] == VULNERABLE:
+            self.next_state[i] = ASYMPTOMATIC
+            changed, was = self._commit(i, i + 1)
+            self._tally(changed, was)
+            self._notify(changed)
+
+    def count_in_state(self, state: Health) -> int:
+        """How many individuals are currently in state?"""
+        return int(self._counts[state.value])
+
+    def counts(self) -> Dict[Health, int]:
+        """Snapshot of how many individuals are in each state"""
+        return {state: int(self._counts[state.value]) for state in Health}
+
+    def counts_by_kind(self) -> Dict[str, Dict[Health, int]]:
+        """Snapshot of how many individuals of each kind are in each state"""
+        return {name: {state: int(self._kind_counts[code, state.value]) for state in Health}
+                for code, name in enumerate(KINDS)}
+
+    def state_at(self, row: int, col: int) -> Health:
+        return Health(int(self.state[row * self.ncols + col]))
+
+    def state_grid(self) -> np.ndarray:
+        """Health state value of every cell, as an nrows x ncols array.
+        A view, not a copy:  it changes as the population steps.
+        """
+        return self.state.reshape(self.nrows, self.ncols)
+
+    def neighbors(self, row: int, col: int) -> List[Tuple[int, int]]:
+        """Addresses of the neighbors of the cell at row, col"""
+        return adjacency.addresses(self.adjacency, row * self.ncols + col, self.ncols)
+
+    def visit(self, address: Tuple[int, int]) -> Cell:
+        """Who lives there?"""
+        row_num, col_num = address
+        if self._cells is not None:
+            return self._cells[row_num][col_num]
+        return Cell(self, row_num, col_num)
+
+
+def _kind_state(kind: np.ndarray, state: np.ndarray) -> np.ndarray:
+    """One code per (kind, state) pair, for counting both at once"""
+    return kind.astype(np.intp) * STATES + state
+
+
+def _contagious(state: np.ndarray) -> np.ndarray:
+    return (state == ASYMPTOMATIC) | (state == SYMPTOMATIC)
+
+
+def _kind_weights() -> np.ndarray:
+    """Probability of each kind under Population._random_kind,
+    which rolls the dice for each kind in turn until one sticks.
+    """
+    proportions = np.array([config.get_float("Grid", f"Proportion_{kind}")
+                            for kind in KINDS])
+    # Chance that the first success in a round is each kind
+    misses = np.cumprod(np.concatenate(([1.0], 1.0 - proportions[:-1])))
+    weights = misses * proportions
+    return weights / weights.sum()
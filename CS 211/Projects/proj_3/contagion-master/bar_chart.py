@@ -1,7 +1,20 @@
-"""Bar chart of current infections and cumulative deaths"""
+"""Bar chart of current infections and cumulative deaths.
+
+The chart has room for ncols columns.  Each kind of bar (color
+and width) gets one canvas item per column, made the first time
+that kind of bar is drawn, and from then on the items are moved
+and resized rather than replaced, so a long run doesn't pile up
+canvas items.  Past the right edge the chart scrolls:  all the
+bars move left together, and the items of columns that scroll
+off the left are reused for new columns on the right, as in a
+ring buffer.  A bar taller than the chart rescales all the bars
+at once.
+"""
 
 import graphics.graphics as graphics
+import math
 import time
+from typing import Dict, List, Tuple
 
 import logging
 logging.basicConfig()
@@ -11,6 +24,12 @@ log.setLevel(logging.DEBUG)
 # re-export color_rgb as chart.rgb
 color = graphics.color_rgb
 
+# Canvas tag of every bar, to move or scale them all in one call
+BARS = "bars"
+# Headroom when a bar outgrows the chart
+GROWTH = 1.5
+
+
 class Chart:
     """The bar chart"""
     def __init__(self, pxwidth: int, pxheight: int,
@@ -19,31 +38,86 @@ class Chart:
         self.width = pxwidth
         self.height = pxheight
         self.ncols = ncols
-        self.win = graphics.GraphWin("Chart", pxwidth, pxheight,autoflush=autoflush)
-        bkgrnd = graphics.Rectangle( graphics.Point(0,0), graphics.Point(pxwidth,pxheight) )
-        bkgrnd.setFill( background )
+        self.win = graphics.GraphWin(title, pxwidth, pxheight,autoflush=autoflush)
+        self.win.setBackground(background)
+        self.v_min = v_min
+        self.v_max = v_max
         self.col_width = pxwidth / ncols
         self.unit_height = pxheight / (v_max - v_min)
+        # Rightmost column on the chart.  Columns numbered
+        # right - ncols + 1 .. right are showing.
+        self.right = ncols
+        # ncols bars of each (color, frac_width); column col's is
+        # at position (col - 1) % ncols
+        self._bars: Dict[Tuple[str, float], List[graphics.Rectangle]] = {}
         self._last_update = time.time()
 
     def bar(self, col: int, height: int, color, frac_width=1.0):
-        if col > self.ncols:
-            log.debug(f"Column {col} off chart")
+        """Column col's bar of this color and width is height tall.
+        Columns are numbered from 1.  A column past the right edge
+        scrolls the chart; one scrolled off the left is ignored.
+        """
+        if col > self.right:
+            self._scroll(col - self.right)
+        if col <= self.right - self.ncols:
+            log.debug(f"Column {col} scrolled off chart")
             return
+        if height > self.v_max:
+            self._rescale(math.ceil(self.v_min + (height - self.v_min) * GROWTH))
+        bars = self._bars.get((color, frac_width))
+        if bars is None:
+            bars = [self._new_bar(color) for _ in range(self.ncols)]
+            self._bars[(color, frac_width)] = bars
         thin_by = (1.0 - frac_width) * self.col_width
-        right = col  * self.col_width - thin_by
-        left = (col - 1) * self.col_width + thin_by
+        position = col - (self.right - self.ncols) - 1
+        left = position * self.col_width + thin_by
+        right = (position + 1) * self.col_width - thin_by
         bottom = self.height
-        top = self.height - (height * self.unit_height) # Measuring from top of window
-        r = graphics.Rectangle(graphics.Point(left,bottom), graphics.Point(right,top))
+        top = self.height - ((height - self.v_min) * self.unit_height) # Measuring from top of window
+        bar = bars[(col - 1) % self.ncols]
+        self.win.coords(bar.id, left, bottom, right, top)
+        self.win.itemconfigure(bar.id, state="normal")
+        self._flush()
+
+    def _new_bar(self, color) -> graphics.Rectangle:
+        """A bar for the pool, hidden until it has a column"""
+        r = graphics.Rectangle(graphics.Point(0, self.height), graphics.Point(0, self.height))
         r.setFill(color)
         r.draw(self.win)
+        self.win.itemconfigure(r.id, state="hidden", tags=BARS)
+        return r
+
+    def _scroll(self, by: int):
+        """Move every bar left by columns; the bars of columns that
+        go off the left are hidden, for new columns on the right
+        """
+        self.win.move(BARS, -by * self.col_width, 0)
+        for col in range(self.right + 1 + max(0, by - self.ncols), self.right + by + 1):
+            for bars in self._bars.values():
+                self.win.itemconfigure(bars[(col - 1) % self.ncols].id, state="hidden")
+        self.right += by
+
+    def _rescale(self, v_max: int):
+        """Fit values up to v_max, shrinking every bar at once"""
+        log.debug(f"Rescaling chart from {self.v_max} to {v_max}")
+        shrink = (self.v_max - self.v_min) / (v_max - self.v_min)
+        self.win.scale(BARS, 0, self.height, 1, shrink)
+        self.v_max = v_max
+        self.unit_height = self.height / (v_max - self.v_min)
+
+    def _flush(self):
+        if self.win.autoflush:
+            self.win.update()
 
 def main():
-    """Smoke test: bars 1..10 """
+    """Smoke test: bars 1..30, on a chart of 10 columns up to 10,
+    so it scrolls and rescales
+    """
     chart = Chart(500,500,ncols=10,v_min=0,v_max=10,title="Stairs")
-    for i in range(1,11):
+    for i in range(1,31):
         chart.bar(i,i,color(200,100,100), frac_width=0.90)
+        chart.bar(i,i // 2,color(0,0,0), frac_width=0.5)
+        time.sleep(0.1)
     input("Press enter to close")
 
 if __name__ == "__main__":
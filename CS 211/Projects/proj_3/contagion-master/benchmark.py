@@ -0,0 +1,219 @@
+"""Benchmarks for the contagion model.
+
+Times the parts of a simulation that matter for speed, for each
+engine at a few grid sizes (tiny.ini, contagion.ini, and big.ini
+with a million individuals):
+
+    build       seconds to construct the population
+    neighbors   seconds to choose neighbors for every cell
+    step        steps per second, right after seeding
+    count       count_in_state calls per second
+    run         days per second for a whole headless run
+
+and the peak memory (resident set size) of each case.  Every case
+runs in a fresh process with a fixed seed, so results are
+repeatable and one case's memory doesn't count against another's.
+
+    python3 benchmark.py                  # Compare with the baseline
+    python3 benchmark.py --save           # Make this run the baseline
+    python3 benchmark.py --case tiny.ini:object --case contagion.ini:array
+
+The baseline (benchmark_baseline.json) is only meaningful on the
+machine that made it:  save one before changing the model, then
+compare after.
+"""
+
+import array_model
+import adjacency
+import config
+import contagion
+import contagion_stats
+import model
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "benchmark_baseline.json")
+SEED = 211
+
+
+class Case(NamedTuple):
+    conf: str
+    engine: str
+    steps: int = 20      # Steps to time
+    full_run: bool = True
+
+    @property
+    def name(self) -> str:
+        return f"{self.conf}:{self.engine}"
+
+
+# A whole run on a million cells takes thousands of steps, so
+# big.ini times steps only
+CASES = [
+    Case("tiny.ini", "object"),
+    Case("tiny.ini", "array"),
+    Case("contagion.ini", "object"),
+    Case("contagion.ini", "array"),
+    Case("big.ini", "array", full_run=False),
+    Case("big.ini", "partitioned", full_run=False),
+    Case("contagion.ini", "event"),
+    Case("big.ini", "event", full_run=False),
+    Case("contagion.ini", "mapped"),
+    Case("big.ini", "mapped", full_run=False),
+]
+
+# Higher is better for these; lower is better for the rest,
+# except that how long a run lasts is neither
+RATES = {"step_per_s", "count_per_s", "run_days_per_s"}
+NOT_COMPARED = {"run_days"}
+
+
+def _timed(f, *args, **kwargs):
+    """Result of f and the seconds it took"""
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def measure(case: Case) -> Dict[str, float]:
+    """Run one case.  Meant to run in a process of its own."""
+    config.configure(os.path.join(HERE, case.conf))
+    nrows, ncols = config.get_int("Grid", "Rows"), config.get_int("Grid", "Cols")
+    engine = contagion.ENGINES[case.engine]
+    results = {}
+
+    # Neighbor tables on their own, for kinds drawn as the array engine does
+    rng = np.random.default_rng(SEED)
+    params = [model.Params.from_config(kind) for kind in array_model.KINDS]
+    kinds = rng.choice(len(params), size=nrows * ncols, p=array_model._kind_weights())
+    num = np.array([p.N_Neighbors for p in params])[kinds]
+    dist = np.array([p.Visit_Dist for p in params])[kinds]
+    _, results["neighbors_s"] = _timed(adjacency.grid_adjacency,
+                                       nrows, ncols, num, dist, rng)
+
+    population, results["build_s"] = _timed(engine, nrows, ncols, seed=SEED)
+    try:
+        population.seed()
+        _, elapsed = _timed(_step, population, case.steps)
+        results["step_per_s"] = case.steps / elapsed
+        calls = 10_000
+        _, elapsed = _timed(_count, population, calls)
+        results["count_per_s"] = calls / elapsed
+    finally:
+        _close(population)
+
+    if case.full_run:
+        population = engine(nrows, ncols, seed=SEED)
+        try:
+            with open(os.devnull, "w") as quiet:
+                stats = contagion_stats.Stats(population, chart=False, out=quiet)
+                _, elapsed = _timed(contagion.run_headless, population, stats)
+            results["run_days"] = population.day
+            results["run_days_per_s"] = population.day / elapsed
+        finally:
+            _close(population)
+
+    # Linux reports kilobytes.  Only this process:  partitioned
+    # workers are not counted.
+    results["peak_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def _step(population, steps: int):
+    for _ in range(steps):
+        population.step()
+
+
+def _count(population, calls: int):
+    states = list(model.Health)
+    for i in range(calls):
+        population.count_in_state(states[i % len(states)])
+
+
+def _close(population):
+    if hasattr(population, "close"):
+        population.close()
+
+
+def run(cases: List[Case]) -> Dict[str, Dict[str, float]]:
+    """Measure each case in a fresh process"""
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        log.info(f"Measuring {case.name}")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1,
+                                                    mp_context=context) as pool:
+            results[case.name] = pool.submit(measure, case).result()
+    return results
+
+
+def report(results: Dict[str, Dict[str, float]],
+           baseline: Dict[str, Dict[str, float]], out=sys.stdout):
+    """One line per measurement, with the change from the baseline.
+    Positive changes are improvements.
+    """
+    print(f"{'case':28} {'measure':16} {'value':>12} {'baseline':>12} {'change':>8}",
+          file=out)
+    for name, measures in results.items():
+        for measure_name, value in measures.items():
+            before = baseline.get(name, {}).get(measure_name)
+            line = f"{name:28} {measure_name:16} {value:12.4g}"
+            if before and measure_name not in NOT_COMPARED:
+                change = value / before - 1 if measure_name in RATES else before / value - 1
+                line += f" {before:12.4g} {change:+8.1%}"
+            print(line, file=out)
+
+
+def parse_case(spec: str) -> Case:
+    conf, _, engine = spec.partition(":")
+    if engine not in contagion.ENGINES:
+        raise argparse.ArgumentTypeError(f"Expected conf:engine, got '{spec}'")
+    known = {case.name: case for case in CASES}
+    return known.get(spec, Case(conf, engine))
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser(description="Benchmarks for the contagion model")
+    parser.add_argument("--case", type=parse_case, action="append",
+                        metavar="CONF:ENGINE",
+                        help="Just this case (repeatable); default all of them")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="Baseline results to compare with")
+    parser.add_argument("--save", action="store_true",
+                        help="Save these results as the baseline")
+    return parser.parse_args()
+
+
+def main():
+    args = cli()
+    results = run(args.case or CASES)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        log.info(f"Saved baseline in {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
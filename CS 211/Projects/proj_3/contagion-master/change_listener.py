@@ -4,6 +4,7 @@ has occurred.
 
 import mvc
 import model
+import array_model
 
 import logging
 logging.basicConfig()
@@ -23,10 +24,17 @@ class ChangeListener(mvc.Listener):
         return self.changes
 
     def notify(self, subject: mvc.Listenable, event: str):
-        """A statechange event sets 'changes' to True"""
-        assert isinstance(subject, model.Individual)  # because argument type is too general
+        """A statechange event sets 'changes' to True.  Listens
+        either to each individual ("newstate") or to the whole
+        population ("changes", once per step).
+        """
         if event == "newstate":
+            assert isinstance(subject, (model.Individual, array_model.Cell))  # because argument type is too general
             self.changes = True
             log.debug("State change")
-        else:
+        elif event == "changes":
+            if len(subject.last_changes) > 0:
+                self.changes = True
+                log.debug(f"{len(subject.last_changes)} state changes")
+        elif event != "timestep":
             log.warning(f"ChangeListener does not handle event type '{event}'")
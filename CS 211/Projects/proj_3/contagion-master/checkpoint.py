@@ -0,0 +1,106 @@
+"""Checkpoints: save a running simulation to a file and pick it
+up again later, to resume a long run, restart after a crash, or
+branch several runs from the same point.
+
+A checkpoint file is
+
+    MAGIC (8 bytes)
+    header length (8 bytes, little-endian)
+    header (JSON):  engine, day, seed, random number generator
+                    state, parameters, caller's metadata (e.g.,
+                    epoch), and where each array is
+    the arrays, raw, each starting on a 64-byte boundary
+
+so the per-cell arrays (health, time in state, kind, prior
+visit, and the neighbor table) can be memory-mapped straight back
+in rather than read and parsed.
+"""
+
+import model
+import array_model
+import parallel_model
+
+import numpy as np
+import json
+import os
+import struct
+from typing import Tuple
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+MAGIC = b"CONTAGN\x01"
+ALIGN = 64
+
+# Engines that know how to checkpoint themselves, by name in the header
+ENGINES = {
+    "object": model.Population,
+    "array": array_model.ArrayPopulation,
+    "partitioned": parallel_model.PartitionedPopulation
+}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def save(population, path: str, **meta):
+    """Write population to path.  meta (anything JSON can hold)
+    comes back from load.  The file is replaced only once the new
+    one is complete, so a crash mid-save leaves the last good one.
+    """
+    engine = next((name for name, the_class in ENGINES.items()
+                   if type(population) is the_class), None)
+    if engine is None:
+        raise ValueError(f"Can't checkpoint a {type(population).__name__}")
+    fields, arrays = population.checkpoint_state()
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape),
+                        "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"engine": engine, "fields": fields,
+                         "meta": meta, "arrays": layout}).encode()
+    base = _aligned(len(MAGIC) + 8 + len(header))
+    temp = f"{path}.tmp"
+    with open(temp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(base + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(base + offset)
+    os.replace(temp, path)
+    log.info(f"Checkpoint of {engine} population, day {population.day}, in {path}")
+
+
+def load(path: str, mmap: bool = True) -> Tuple[object, dict]:
+    """The population saved in path, and the metadata saved with it.
+    With mmap, the arrays are mapped copy-on-write:  the population
+    can run on without touching the file.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a contagion checkpoint")
+        length, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    base = _aligned(len(MAGIC) + 8 + length)
+    arrays = {name: _read_array(path, base + where["offset"],
+                                np.dtype(where["dtype"]), tuple(where["shape"]), mmap)
+              for name, where in header["arrays"].items()}
+    population = ENGINES[header["engine"]].from_checkpoint(header["fields"], arrays)
+    return population, header["meta"]
+
+
+def _read_array(path: str, offset: int, dtype: np.dtype, shape: Tuple[int, ...],
+                mmap: bool) -> np.ndarray:
+    count = int(np.prod(shape))
+    if count == 0:
+        return np.empty(shape, dtype=dtype)   # Can't map zero bytes
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=shape)
+    return np.fromfile(path, dtype=dtype, count=count, offset=offset).reshape(shape)
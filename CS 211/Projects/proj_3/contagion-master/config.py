@@ -40,3 +40,25 @@ def get_pcnt(section: str, parameter: str) -> float:
 
 
 
+
+def override(parameter: str, value: str, section: str = None):
+    """Replace a parameter value after reading the configuration,
+    e.g., to vary it in a sensitivity analysis.  With no section,
+    the value replaces the parameter everywhere it is set.
+    A parameter that isn't set anywhere is a ValueError, since
+    it's most likely misspelled.
+    """
+    assert CONF, "Must call configure first"
+    if section:
+        if not CONF.has_section(section) or parameter not in CONF[section]:
+            raise ValueError(f"No parameter {parameter} in section [{section}]")
+        sections = [section]
+    else:
+        key = CONF.optionxform(parameter)
+        sections = [name for name in CONF.sections() if key in CONF._sections[name]]
+        if key in CONF.defaults():
+            sections.insert(0, CONF.default_section)
+        if not sections:
+            raise ValueError(f"No parameter {parameter} in the configuration")
+    for name in sections:
+        CONF[name][parameter] = str(value)
@@ -1,90 +1,266 @@
 """Simple grid model of contagion"""
 
-import grid_view
-import change_listener
 import model
+import array_model
+import parallel_model
+import event_model
+import mapped_model
+import network_model
 import contagion_stats
+import checkpoint
+import recorder
+import frames
+import simulation
+import profiling
 
 import time
 import config
 import argparse
+import os
+import sys
 
 import logging
 logging.basicConfig()
 log = logging.getLogger(__name__)
 log.setLevel(logging.WARN)
 
+# Interchangeable implementations of the population model
+ENGINES = {
+    "object": model.Population,
+    "array": array_model.ArrayPopulation,
+    "partitioned": parallel_model.PartitionedPopulation,
+    "event": event_model.EventPopulation,
+    "mapped": mapped_model.MappedPopulation
+}
 
-def cli() -> object:
+# Days between progress reports
+EPOCH = 10
+# Times a second the display is redrawn
+FRAME_RATE = 20
+
+
+def quiescent(population: model.Population) -> bool:
+    """Nobody is contagious, so nobody's state can change again"""
+    return (population.count_in_state(model.Health.asymptomatic) == 0
+            and population.count_in_state(model.Health.symptomatic) == 0)
+
+
+def run_id(conf: str, population: model.Population) -> str:
+    """Configuration, engine and seed of a run, e.g.,
+    'contagion.ini:array:1234', so that runs appended to the
+    same record can be told apart
+    """
+    if isinstance(population, network_model.NetworkPopulation):
+        engine = "network"
+    else:
+        engine = next(name for name, the_class in ENGINES.items()
+                      if type(population) is the_class)
+    if getattr(population, "block_random", False):
+        engine += "+block-random"
+    return f"{os.path.basename(conf)}:{engine}:{population.seed_sequence.entropy}"
+
+
+def cli(argv=None) -> object:
     """Command line interface returns an object with
-    an instance variable for each command line argument.
+    an instance variable for each command line argument
+    (from argv, or else the command line).
     """
     parser = argparse.ArgumentParser(
         description="Contagion, a simple model of disease spread")
     parser.add_argument("conf", nargs="?",
                         default="contagion.ini")
-    return parser.parse_args()
+    parser.add_argument("--engine", choices=sorted(ENGINES),
+                        default="object",
+                        help="One Python object per cell, NumPy arrays, "
+                             "NumPy arrays stepped by several processes, "
+                             "only the cells with something to do each day, "
+                             "or NumPy arrays in files on disk")
+    parser.add_argument("--map-dir", metavar="DIR",
+                        help="Where the mapped engine keeps its files "
+                             "(default a temporary directory)")
+    parser.add_argument("--network", metavar="FILE",
+                        help="Individuals are the nodes of the contact network "
+                             "in edge list FILE, not a grid (object engine only)")
+    parser.add_argument("--block-random", action="store_true",
+                        help="Object engine:  roll everyone's visit dice in one "
+                             "go each day, and skip individuals with nothing to do")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Random seed, to repeat a run exactly")
+    parser.add_argument("--headless", action="store_true",
+                        help="No display: run at full speed, print statistics only")
+    parser.add_argument("--output", type=argparse.FileType("w"),
+                        default=sys.stdout,
+                        help="Where to write statistics (default stdout)")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="Save the simulation to FILE after every epoch "
+                             "(headless only)")
+    parser.add_argument("--resume", metavar="FILE",
+                        help="Carry on from a checkpoint saved in FILE, instead "
+                             "of starting afresh (headless only)")
+    parser.add_argument("--raster", action="store_true",
+                        help="Draw the grid as one image, redrawn every step "
+                             "(for grids about as big as the window, or bigger)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="Append the count in each state, every day, "
+                             "to CSV file FILE")
+    parser.add_argument("--run-id", metavar="ID",
+                        help="How --record tells this run apart from others in "
+                             "the same file (default configuration, engine and seed)")
+    parser.add_argument("--frames", metavar="DIR",
+                        help="Write a picture of the grid to DIR every few days "
+                             "(no display needed)")
+    parser.add_argument("--frame-every", type=int, default=1, metavar="DAYS")
+    parser.add_argument("--frame-format", choices=frames.FORMATS, default="png")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each phase of the run and print a breakdown "
+                             "to stderr at the end")
+    args = parser.parse_args(argv)
+    if (args.checkpoint or args.resume) and not args.headless:
+        parser.error("--checkpoint and --resume need --headless")
+    if args.checkpoint and args.engine not in checkpoint.ENGINES:
+        parser.error(f"--checkpoint needs an engine that can be saved: "
+                     f"{', '.join(sorted(checkpoint.ENGINES))}")
+    if args.network and (args.engine != "object" or args.resume or args.checkpoint):
+        parser.error("--network needs the object engine, and can't be checkpointed "
+                     "or resumed")
+    if args.block_random and (args.engine != "object" or args.resume):
+        parser.error("--block-random is for a new run of the object engine")
+    return args
 
 
 def main():
     """View a simulation of contagion"""
     args = cli()
-    config.configure(args.conf)
-    n_rows = config.get_int("Grid", "rows")
-    n_cols = config.get_int("Grid", "cols")
+    if args.profile:
+        profiling.enable()
+    with profiling.phase("config"):
+        config.configure(args.conf)
+        n_rows = config.get_int("Grid", "rows")
+        n_cols = config.get_int("Grid", "cols")
+
+    with profiling.phase("build"):
+        meta = {}
+        if args.resume:
+            # Engine, grid size and parameters come from the checkpoint
+            population, meta = checkpoint.load(args.resume)
+        elif args.network:
+            population = network_model.NetworkPopulation.from_file(
+                args.network, seed=args.seed, block_random=args.block_random)
+        else:
+            options = {}
+            if args.engine == "mapped":
+                options["directory"] = args.map_dir
+            if args.block_random:
+                options["block_random"] = True
+            population = ENGINES[args.engine](n_rows, n_cols, seed=args.seed, **options)
+    with profiling.phase("listeners"):
+        if args.record:
+            record = recorder.Recorder(population, args.record,
+                                       run=args.run_id or run_id(args.conf, population))
+        if args.frames:
+            frames.FrameWriter(population, args.frames, every=args.frame_every,
+                               format=args.frame_format)
+    if args.headless:
+        stats = contagion_stats.Stats(population, chart=False, out=args.output)
+        if "stats" in meta:
+            stats.resume(meta["stats"])
+        run_headless(population, stats, epoch=meta.get("epoch", 0),
+                     checkpoint_path=args.checkpoint)
+    else:
+        run_gui(population, args.output, raster=args.raster)
+    if args.record:
+        record.close()
+    if hasattr(population, "close"):
+        population.close()
+    if args.profile:
+        profiling.report(sys.stderr)
 
-    population = model.Population(n_rows, n_cols)
+
+def run_headless(population: model.Population, stats: contagion_stats.Stats,
+                 epoch: int = 0, checkpoint_path: str = None):
+    """Run a simulation to quiescence as fast as possible,
+    with no display.  A population resumed from a checkpoint
+    carries on from the given epoch rather than being seeded.
+    With checkpoint_path, save to it after every epoch.
+    """
+    if epoch == 0:
+        log.info("Seeding")
+        population.seed()
+
+    # Stop as soon as nobody is contagious.  Report every epoch,
+    # and whatever part of an epoch there is at the end.
+    log.info("Running")
+    for day in simulation.days(population, stats, quiescent, EPOCH, epoch):
+        if day.epoch:
+            with profiling.phase("report"):
+                stats.show(day=day.day, epoch=day.epoch)
+            if checkpoint_path:
+                with profiling.phase("checkpoint"):
+                    checkpoint.save(population, checkpoint_path,
+                                    epoch=day.epoch, stats=stats.summary())
+
+    stats.show_summary()
+
+
+def run_gui(population: model.Population, out, raster: bool = False):
+    """Run a simulation with a grid view and bar chart.
+    With raster, the grid is drawn as one image rather than a
+    rectangle per cell.  The simulation runs at full speed in
+    a thread of its own; the display shows the latest state
+    FRAME_RATE times a second, skipping any days in between.
+    """
+    # Importing the graphics package opens a Tk display
+    import grid_view
+    n_rows, n_cols = population.nrows, population.ncols
 
     # View of the main model
-    view = grid_view.GridView(config.get_int("Grid", "Width"),
-                              config.get_int("Grid", "Height"),
-                              nrows=n_rows, ncols=n_cols,
-                              title="Contagion", autoflush=False)
+    width, height = config.get_int("Grid", "Width"), config.get_int("Grid", "Height")
+    if raster:
+        view = grid_view.RasterView(width, height, title="Contagion")
+        population_view = view
+    else:
+        view = grid_view.GridView(width, height,
+                                  nrows=n_rows, ncols=n_cols,
+                                  title="Contagion", autoflush=False)
+        population_view = grid_view.PopulationView(view)
 
     # Summary statistics
-    stats_view = contagion_stats.Stats(population)
-
-    # Monitor changes to cells ---
-    #    - for monitoring progress
-    #    - for updating the main view
-    monitor = change_listener.ChangeListener()
-    # Attach listeners to each cell
-    for row in range(n_rows):
-        for col in range(n_cols):
-            cell_view = grid_view.CellView(row, col, view)
-            population.cells[row][col].add_listener(cell_view)  # Graphics
-            population.cells[row][col].add_listener(monitor)    # Change tracking
-        view.update(rate=5)
+    stats_view = contagion_stats.Stats(population, out=out)
 
     # Initial view, before simulation starts
+    population_view.show(population.state_grid())
     view.update()
     time.sleep(1)
     log.info("Seeding")
-    population.seed()  # Note this should set change monitor
+    population.seed()
+    population_view.show(population.state_grid())
     view.update()
     time.sleep(1)
 
-    # Evolve until it reaches quiescence
+    # Evolve until it reaches quiescence:  nobody left who could
+    # infect anyone, so nothing more can change.  We chart each
+    # 'epoch' of 10 steps rather than each step, and whatever part
+    # of an epoch there is at the end.  From here on only the
+    # simulation thread touches the population.
     log.info("Running")
-    steps = 0
-    epoch = 0
-    monitor.set(True)
-    while monitor.check():
-        monitor.set(False)  # No changes yet in this cycle
-        # An 'epoch' is 10 steps.  We stop when an epoch has
-        # gone by without a noticeable state change, and we
-        # chart each epoch rather than each step
-        for _ in range(10):
-            steps += 1
-            log.debug(f"Step {steps}")
-            population.step()
-            view.update()
-            stats_view.update(day=steps)
-            time.sleep(0.1)
-        epoch += 1
-
-        # Print stats and update bar graph after each epoch
-        stats_view.show(day=steps, epoch=epoch)
+    sim = simulation.Simulation(population, stats_view, quiescent,
+                                epoch=EPOCH, rate=FRAME_RATE)
+    sim.start()
+    last = False
+    while not last:
+        snapshot = sim.latest(timeout=1 / FRAME_RATE)
+        if snapshot:
+            with profiling.phase("draw"):
+                population_view.show(snapshot.states)
+            last = snapshot.last
+        while not sim.epochs.empty():
+            # Print stats and update bar graph after each epoch
+            report = sim.epochs.get()
+            with profiling.phase("report"):
+                stats_view.show(day=report.day, epoch=report.epoch, counts=report.counts)
+        with profiling.phase("display"):
+            view.update(rate=FRAME_RATE)
+    sim.join()
 
     # Simulation is no longer changing.  Leave view open
     # until the user presses enter
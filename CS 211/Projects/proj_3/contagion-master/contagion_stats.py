@@ -4,22 +4,36 @@ contagion model.
 
 import model
 import config
-import bar_chart
+import sys
+from typing import Dict, TextIO
+
+# Summary stats carried over when a run is resumed from a checkpoint
+SUMMARY = ["max_symptomatic", "max_period_dead", "prior_day_dead",
+           "prior_period_dead", "max_symptomatic_day", "max_deaths_day"]
 
 class Stats:
-    def __init__(self, population: model.Population):
+    def __init__(self, population: model.Population,
+                 chart: bool = True, out: TextIO = sys.stdout):
         self.pop = population
-        # Accompanying chart of current cases and total deaths
-        chart_width = config.get_int("Chart", "Width")
-        chart_height = config.get_int("Chart", "Height")
-        self.chart = bar_chart.Chart(chart_width,
-                                chart_height,
-                                config.get_int("Chart", "Cols"),
-                                v_min=0,
-                                v_max=config.get_int("Chart", "Max"),
-                                title="Current cases, cumulative deaths")
-        # Move the chart out from under the main model view
-        self.chart.win.master.geometry(f"{chart_width}x{chart_height}-5+0")
+        self.out = out
+        self.chart = None
+        if chart:
+            # Importing the graphics package opens a Tk display,
+            # so headless runs must not import bar_chart at all.
+            import bar_chart
+            # Accompanying chart of current cases and total deaths
+            chart_width = config.get_int("Chart", "Width")
+            chart_height = config.get_int("Chart", "Height")
+            self.chart = bar_chart.Chart(chart_width,
+                                    chart_height,
+                                    config.get_int("Chart", "Cols"),
+                                    v_min=0,
+                                    v_max=config.get_int("Chart", "Max"),
+                                    title="Current cases, cumulative deaths")
+            # Move the chart out from under the main model view
+            self.chart.win.master.geometry(f"{chart_width}x{chart_height}-5+0")
+            self.cases_color = bar_chart.color(250, 200, 250)
+            self.deaths_color = bar_chart.color(0, 0, 0)
         #
         # Summary stats
         self.max_symptomatic = 0
@@ -29,6 +43,15 @@ class Stats:
         self.max_symptomatic_day = 0
         self.max_deaths_day = 0
 
+    def summary(self) -> dict:
+        """Summary stats so far, e.g., to save in a checkpoint"""
+        return {name: getattr(self, name) for name in SUMMARY}
+
+    def resume(self, summary: dict):
+        """Carry on from summary stats of an earlier run"""
+        for name in SUMMARY:
+            setattr(self, name, summary[name])
+
     def update(self, day=0):
         current_cases = self.pop.count_in_state(model.Health.symptomatic)
         deaths = self.pop.count_in_state(model.Health.dead)
@@ -41,23 +64,29 @@ class Stats:
             self.max_symptomatic_day = day
         self.prior_day_dead = deaths
 
-    def show(self, day: int, epoch: int):
-        current_cases = self.pop.count_in_state(model.Health.symptomatic)
-        deaths = self.pop.count_in_state(model.Health.dead)
+    def show(self, day: int, epoch: int, counts: Dict[model.Health, int] = None):
+        """Report on the population as it is now, or as it was
+        when counts were taken (e.g., in a simulation.Snapshot)
+        """
+        if counts is None:
+            counts = self.pop.counts()
+        current_cases = counts[model.Health.symptomatic]
+        deaths = counts[model.Health.dead]
         new_deaths = deaths - self.prior_period_dead
         self.prior_period_dead = deaths
 
         print(f"Day {day:3}\t{current_cases:4} symptomatic\t{deaths:4}" +
-              f" cumulative deaths ({new_deaths:4} this period)")
-        self.chart.bar(epoch, current_cases,
-                  color=bar_chart.color(250, 200, 250))
-        self.chart.bar(epoch, deaths,
-                  color=bar_chart.color(0,0,0),frac_width=0.75)
+              f" cumulative deaths ({new_deaths:4} this period)", file=self.out)
+        if self.chart:
+            self.chart.bar(epoch, current_cases, color=self.cases_color)
+            self.chart.bar(epoch, deaths,
+                      color=self.deaths_color, frac_width=0.75)
 
     def show_summary(self):
         print(f"Peak {self.max_symptomatic} symptomatic " +
-              f"on day {self.max_symptomatic_day}")
-        print(f"Peak {self.max_period_dead} deaths on day {self.max_deaths_day}")
+              f"on day {self.max_symptomatic_day}", file=self.out)
+        print(f"Peak {self.max_period_dead} deaths on day {self.max_deaths_day}",
+              file=self.out)
 
 
 
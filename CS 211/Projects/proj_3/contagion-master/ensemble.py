@@ -0,0 +1,239 @@
+"""Statistics of the daily course of many replicate runs.
+
+An Ensemble takes the count in each health state, day by day, of
+one run after another, and keeps for each day and state
+
+    the mean and variance, updated run by run (Welford's method)
+    a histogram of counts in bins whose width grows with the count
+        (as in DDSketch), from which quantiles are estimated to
+        within a fraction (accuracy) of their value
+
+Counts below linear = 1 / (gamma - 1), where gamma = (1 + accuracy)
+/ (1 - accuracy), get a bin each, so the small counts of curves
+like the dead or the symptomatic come out exactly.  Above that,
+bin linear + j holds counts in [linear * gamma ** j,
+linear * gamma ** (j + 1)), so counts in the thousands share bins.
+
+So an Ensemble's size depends on how long runs last and on how
+many bins it takes to reach the population size, but not on how
+many runs there are.  Ensembles of the same population size and
+accuracy merge exactly, so worker processes can each sum up some
+of the runs and send back just their Ensemble.
+
+A run that ends early (nobody contagious any more) stays as it
+ended:  its final counts stand for it on every later day, so
+every day's statistics are over all the runs.
+
+    curves = ensemble.Ensemble(size=10_000)
+    tracker = ensemble.Tracker(population)
+    ... run the simulation ...
+    curves.add_run(tracker.series())
+    curves.write_csv(sys.stdout)
+"""
+
+import mvc
+from model import Health
+
+import csv
+import math
+import numpy as np
+from typing import List, Sequence, TextIO
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+ACCURACY = 0.01
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+STATES = list(Health)
+
+
+class Moments:
+    """Count, mean, and sum of squared deviations (m2) of some
+    observations, and a histogram of them, for each day and state
+    """
+
+    def __init__(self, days: int, bins: int):
+        self.n = np.zeros(days, dtype=np.int64)
+        self.mean = np.zeros((days, len(STATES)))
+        self.m2 = np.zeros((days, len(STATES)))
+        self.hist = np.zeros((days, len(STATES), bins), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.n.size
+
+    def grow(self, days: int):
+        """Room for at least days days"""
+        if days <= len(self):
+            return
+        extra = max(days, 2 * len(self)) - len(self)
+        self.n = np.concatenate([self.n, np.zeros(extra, dtype=np.int64)])
+        self.mean = np.concatenate([self.mean, np.zeros((extra, len(STATES)))])
+        self.m2 = np.concatenate([self.m2, np.zeros((extra, len(STATES)))])
+        self.hist = np.concatenate([self.hist, np.zeros((extra,) + self.hist.shape[1:],
+                                                        dtype=np.int64)])
+
+    def add(self, first: int, values: np.ndarray, bins: np.ndarray):
+        """One more observation for each of days first, first+1, ...:
+        values[i] (and its bins[i]) for day first + i
+        """
+        days = slice(first, first + len(values))
+        self.n[days] += 1
+        delta = values - self.mean[days]
+        self.mean[days] += delta / self.n[days, None]
+        self.m2[days] += delta * (values - self.mean[days])
+        day_i, state_i = np.indices(bins.shape)
+        np.add.at(self.hist, (first + day_i, state_i, bins), 1)
+
+    def merge(self, other: "Moments"):
+        """Add other's observations to ours"""
+        self.grow(len(other))
+        days = slice(0, len(other))
+        self.mean[days], self.m2[days] = _chan(self.n[days, None], self.mean[days], self.m2[days],
+                                               other.n[:, None], other.mean, other.m2)
+        self.n[days] += other.n
+        self.hist[days] += other.hist
+
+
+def _chan(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Mean and m2 of two sets of observations together
+    (Chan, Golub and LeVeque's pairwise update)
+    """
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = mean_a + np.where(n > 0, delta * n_b / n, 0.0)
+        m2 = m2_a + m2_b + np.where(n > 0, delta ** 2 * n_a * n_b / n, 0.0)
+    return mean, m2
+
+
+class Ensemble:
+    """Per-day statistics of runs of a population of size
+    individuals, with quantiles to within accuracy of their value
+    """
+
+    def __init__(self, size: int, accuracy: float = ACCURACY):
+        self.size = size
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.linear = math.ceil(1 / (self.gamma - 1))
+        self.bins = int(self._bin(np.array([max(size, self.linear)]))[0]) + 1
+        self.runs = 0
+        self.days = 0       # The longest run so far
+        # Runs still going on each day, and, by the day they ended,
+        # the final counts of runs that ended
+        self._going = Moments(0, self.bins)
+        self._ended = Moments(0, self.bins)
+
+    def add_run(self, series: np.ndarray):
+        """Counts of one run, a row per day (1, 2, ...) and a column
+        per health state in the order of model.Health
+        """
+        series = np.asarray(series, dtype=np.int64)
+        days = len(series)
+        if days == 0:
+            raise ValueError("A run must last at least a day")
+        self._going.grow(days)
+        self._ended.grow(days)
+        self._going.add(0, series.astype(float), self._bin(series))
+        self._ended.add(days - 1, series[-1:].astype(float), self._bin(series[-1:]))
+        self.runs += 1
+        self.days = max(self.days, days)
+
+    def merge(self, other: "Ensemble"):
+        """Add the runs of another ensemble (e.g., from another process)"""
+        if (other.size, other.accuracy) != (self.size, self.accuracy):
+            raise ValueError(f"Can't merge ensembles of {other.size} to {other.accuracy} "
+                             f"with {self.size} to {self.accuracy}")
+        self._going.merge(other._going)
+        self._ended.merge(other._ended)
+        self.runs += other.runs
+        self.days = max(self.days, other.days)
+
+    def _combined(self) -> Moments:
+        """Each day's statistics over all runs, those that ended
+        before then counted as they ended
+        """
+        result = Moments(self.days, self.bins)
+        result.merge(self._going)
+        ended = self._ended
+        n = 0
+        mean = m2 = np.zeros(len(STATES))
+        hist = np.zeros((len(STATES), self.bins), dtype=np.int64)
+        for day in range(1, self.days):
+            # Runs that ended yesterday stay as they were
+            mean, m2 = _chan(n, mean, m2, ended.n[day - 1],
+                             ended.mean[day - 1], ended.m2[day - 1])
+            n += ended.n[day - 1]
+            hist += ended.hist[day - 1]
+            result.mean[day], result.m2[day] = _chan(result.n[day], result.mean[day],
+                                                     result.m2[day], n, mean, m2)
+            result.n[day] += n
+            result.hist[day] += hist
+        return result
+
+    def summary(self, quantiles: Sequence[float] = QUANTILES) -> dict:
+        """Arrays, each a row per day and a column per state:  "mean",
+        "sd" (sample standard deviation) and each quantile q
+        """
+        combined = self._combined()
+        n = combined.n[:self.days, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sd = np.sqrt(np.where(n > 1, combined.m2[:self.days] / (n - 1), np.nan))
+        result = {"mean": combined.mean[:self.days], "sd": sd}
+        for q in quantiles:
+            result[q] = self._quantile(combined.hist[:self.days], q)
+        return result
+
+    def _bin(self, counts: np.ndarray) -> np.ndarray:
+        """Bin of each count"""
+        with np.errstate(divide="ignore"):
+            j = np.floor(np.log(counts / self.linear) / math.log(self.gamma) + 1e-9)
+        return np.where(counts < self.linear, counts, self.linear + j).astype(np.int64)
+
+    def _quantile(self, hist: np.ndarray, q: float) -> np.ndarray:
+        """Estimate of quantile q from histograms (days x states x bins):
+        the count of a bin of one count, or else the count in the
+        middle (relatively) of the bin it falls in
+        """
+        cumulative = np.cumsum(hist, axis=-1)
+        wanted = np.maximum(q * cumulative[..., -1:], 1e-9)
+        b = np.argmax(cumulative >= wanted, axis=-1)
+        middle = self.linear * self.gamma ** (b - self.linear) * 2 * self.gamma / (self.gamma + 1)
+        return np.minimum(np.where(b < self.linear, b, middle), self.size)
+
+    def write_csv(self, out: TextIO, prefix: Sequence[str] = (), labels: Sequence[str] = (),
+                  quantiles: Sequence[float] = QUANTILES, header: bool = True):
+        """One row per day and state:  day, state, runs, mean, sd,
+        and the quantiles, after the values in prefix (headed labels)
+        """
+        writer = csv.writer(out)
+        if header:
+            writer.writerow(list(labels) + ["day", "state", "runs", "mean", "sd"]
+                            + [f"q{round(q * 100):02d}" for q in quantiles])
+        summary = self.summary(quantiles)
+        for day in range(self.days):
+            for s, state in enumerate(STATES):
+                writer.writerow(list(prefix) + [day + 1, state.name, self.runs,
+                                                f"{summary['mean'][day, s]:.3f}",
+                                                f"{summary['sd'][day, s]:.3f}"]
+                                + [f"{summary[q][day, s]:.1f}" for q in quantiles])
+
+
+class Tracker(mvc.Listener):
+    """Keeps one run's counts, day by day, for an Ensemble"""
+
+    def __init__(self, population: mvc.Listenable):
+        self.pop = population
+        self._rows: List[List[int]] = []
+        population.add_listener(self)
+
+    def notify(self, subject: mvc.Listenable, event: str):
+        if event == "timestep":
+            counts = subject.counts()
+            self._rows.append([counts[state] for state in STATES])
+
+    def series(self) -> np.ndarray:
+        """Counts so far, a row per day and a column per state"""
+        return np.array(self._rows, dtype=np.int64).reshape(-1, len(STATES))
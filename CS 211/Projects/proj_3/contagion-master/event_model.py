@@ -0,0 +1,253 @@
+"""Event-driven population:  same model, but only individuals
+with something to do on a given day are touched that day.
+
+Once an individual is infected, the rest of its illness is known
+or can be drawn at once, so it is scheduled in a priority queue
+rather than checked daily.  Counting days as in Population.step,
+an individual infected on day d
+
+    becomes symptomatic on day  o = d + T_Incubate + 2
+    dies on day o + k, where k is the first day its daily
+         P_Death dice say so, if k <= T_Recover + 1
+    otherwise recovers on day   o + T_Recover + 2
+
+Visits matter only when one party is contagious and the other
+vulnerable, so only contagious individuals, and vulnerable ones
+with a contagious neighbor, are "active":  their visit days are
+drawn as gaps between successes of their daily P_Visit dice and
+queued as events too.  The only trace an inactive individual's
+visits leave is whether its next visit is to someone new or a
+return visit (and to whom); that is drawn for the whole idle
+stretch at once when it becomes active again.
+
+Each day still has the decide-then-commit structure of
+Population.step:  visits see only the states at the start of the
+day, and all changes take effect together at the end of it.
+"""
+
+import array_model
+from array_model import ASYMPTOMATIC, SYMPTOMATIC, RECOVERED, DEAD, VULNERABLE, AT_RISK
+import model
+import profiling
+
+import numpy as np
+import heapq
+import math
+import random
+from typing import List, Set, Tuple
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+# Kinds of event, and the state each change event leads to
+VISIT, ONSET, DEATH, RECOVERY = range(4)
+OUTCOME = {ONSET: SYMPTOMATIC, DEATH: DEAD, RECOVERY: RECOVERED}
+
+
+class EventPopulation(array_model.ArrayPopulation):
+    """Drop-in alternative to model.Population for sparse outbreaks
+    on big grids.  Builds the same population as ArrayPopulation
+    from the same seed, but doesn't keep time_in_state or
+    prior_visit arrays up to date, so it can't be checkpointed.
+    """
+
+    def __init__(self, nrows: int, ncols: int, seed: model.Seed = None):
+        super().__init__(nrows, ncols, seed)
+        n = nrows * ncols
+        self.dice = random.Random(int(self.rng.integers(2 ** 63)))
+        # Who has each cell as a neighbor (the table turned around)
+        table = self.adjacency
+        order = np.argsort(table.index, kind="stable")
+        self._rev_index = np.repeat(np.arange(n), np.diff(table.start))[order]
+        self._rev_start = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(table.index, minlength=n), out=self._rev_start[1:])
+        # Scalar access to numpy arrays is much faster via memoryview
+        self._state = memoryview(self.state)
+        self._kind = memoryview(self.kind)
+        self._start = memoryview(table.start)
+        self._index = memoryview(table.index)
+        self._p_visit = self.P_Visit.tolist()
+        self._p_transmit = self.P_Transmit.tolist()
+        self._p_death = self.P_Death.tolist()
+        self._t_incubate = self.T_Incubate.tolist()
+        self._t_recover = self.T_Recover.tolist()
+        # Per individual:  whom they visit next if it's a return visit
+        # (-1 if not), how many contagious neighbors they have, whether
+        # they are active, the day up to which their visits are
+        # accounted for, and a version number that goes stale
+        # queued visits when they become inactive
+        self._prior = [-1] * n
+        self._hot = [0] * n
+        self._active = bytearray(n)
+        self._synced = [0] * n
+        self._version = [0] * n
+        # Queue of (day, sequence, event, cell, version)
+        self._queue: List[Tuple[int, int, int, int, int]] = []
+        self._sequence = 0
+
+    def seed(self):
+        """Patient zero"""
+        i = int(self.rng.integers(self.state.size))
+        if self.state[i] == VULNERABLE:
+            self._commit_day(self.day, [], {i})
+
+    def step(self):
+        """Process today's events, then time passes"""
+        log.debug("EventPopulation: Step")
+        day = self.day + 1
+        changes = []
+        infected: Set[int] = set()
+        queue = self._queue
+        with profiling.phase("step.decide"):
+            while queue and queue[0][0] == day:
+                _, _, event, cell, version = heapq.heappop(queue)
+                if event == VISIT:
+                    if version == self._version[cell]:
+                        self._visit(cell, day, infected)
+                else:
+                    changes.append((event, cell))
+        with profiling.phase("step.commit"):
+            self._commit_day(day, changes, infected)
+        with profiling.phase("step.notify"):
+            self.day = day
+            self.notify_all("timestep")
+
+    def _schedule(self, day: int, event: int, cell: int):
+        self._sequence += 1
+        heapq.heappush(self._queue, (day, self._sequence, event, cell,
+                                     self._version[cell]))
+
+    def _gap(self, p: float) -> float:
+        """Days until the next success of daily dice with probability p"""
+        if p >= 1.0:
+            return 1
+        if p <= 0.0:
+            return math.inf
+        return int(math.log(1.0 - self.dice.random()) / math.log(1.0 - p)) + 1
+
+    def _new_host(self, cell: int) -> int:
+        """A neighbor chosen at random, or -1 if there are none"""
+        lo, hi = self._start[cell], self._start[cell + 1]
+        if hi == lo:
+            return -1
+        return self._index[lo + int(self.dice.random() * (hi - lo))]
+
+    def _visit(self, cell: int, day: int, infected: Set[int]):
+        """cell pays a visit, new or return, as in Population.step"""
+        host = self._prior[cell]
+        if host < 0:
+            host = self._new_host(cell)
+            self._prior[cell] = host
+        else:
+            self._prior[cell] = -1
+        self._synced[cell] = day
+        gap = self._gap(self._p_visit[self._kind[cell]])
+        if gap < math.inf:
+            self._schedule(day + gap, VISIT, cell)
+        if host < 0:
+            return
+        if self._kind[host] == AT_RISK and not self._is_neighbor(host, cell):
+            return
+        # Either party of a meeting may infect the other
+        state = self._state
+        if (_contagious(state[host]) and state[cell] == VULNERABLE
+                and self.dice.random() < self._p_transmit[self._kind[host]]):
+            infected.add(cell)
+        if (_contagious(state[cell]) and state[host] == VULNERABLE
+                and self.dice.random() < self._p_transmit[self._kind[cell]]):
+            infected.add(host)
+
+    def _is_neighbor(self, cell: int, other: int) -> bool:
+        lo, hi = self._start[cell], self._start[cell + 1]
+        return other in self._index[lo:hi].tolist()
+
+    def _commit_day(self, day: int, changes: List[Tuple[int, int]], infected: Set[int]):
+        """End of day:  the day's state changes take effect together"""
+        state = self._state
+        changed, was = [], []
+        touched = set()
+        for event, cell in changes:
+            changed.append(cell)
+            was.append(state[cell])
+            state[cell] = OUTCOME[event]
+            touched.add(cell)
+            if event == ONSET:
+                self._schedule_outcome(cell, day)
+            else:
+                self._cooling(cell, touched)
+        for cell in sorted(infected):
+            changed.append(cell)
+            was.append(state[cell])
+            state[cell] = ASYMPTOMATIC
+            touched.add(cell)
+            self._schedule(day + self._t_incubate[self._kind[cell]] + 2, ONSET, cell)
+            self._heating(cell, touched)
+        for cell in sorted(touched):
+            self._update_active(cell, day)
+        changed = np.array(changed, dtype=np.intp)
+        self._tally(changed, np.array(was, dtype=np.int8))
+        self._notify(changed)
+
+    def _schedule_outcome(self, cell: int, onset: int):
+        """Death or recovery of a newly symptomatic individual"""
+        kind = self._kind[cell]
+        until_death = self._gap(self._p_death[kind])
+        if until_death <= self._t_recover[kind] + 1:
+            self._schedule(onset + until_death, DEATH, cell)
+        else:
+            self._schedule(onset + self._t_recover[kind] + 2, RECOVERY, cell)
+
+    def _heating(self, cell: int, touched: Set[int]):
+        """cell became contagious:  those who might visit it care"""
+        for other in self._rev_index[self._rev_start[cell]:self._rev_start[cell + 1]].tolist():
+            self._hot[other] += 1
+            touched.add(other)
+
+    def _cooling(self, cell: int, touched: Set[int]):
+        """cell stopped being contagious"""
+        for other in self._rev_index[self._rev_start[cell]:self._rev_start[cell + 1]].tolist():
+            self._hot[other] -= 1
+            touched.add(other)
+
+    def _update_active(self, cell: int, day: int):
+        """Start or stop scheduling visits for cell, as of the end of day"""
+        state = self._state[cell]
+        wanted = _contagious(state) or (state == VULNERABLE and self._hot[cell] > 0)
+        if wanted and not self._active[cell]:
+            self._active[cell] = True
+            self._catch_up(cell, day)
+            gap = self._gap(self._p_visit[self._kind[cell]])
+            if gap < math.inf:
+                self._schedule(day + gap, VISIT, cell)
+        elif not wanted and self._active[cell]:
+            self._active[cell] = False
+            self._version[cell] += 1
+            self._synced[cell] = day
+
+    def _catch_up(self, cell: int, day: int):
+        """Account for visits cell made while inactive, through day.
+        Each visit alternates between someone new (chosen at random)
+        and a return visit, so only whether there were none, an odd
+        number, or an even number matters.
+        """
+        days = day - self._synced[cell]
+        self._synced[cell] = day
+        p = self._p_visit[self._kind[cell]]
+        if days <= 0 or p <= 0.0:
+            return
+        none = (1.0 - p) ** days
+        odd = (1.0 - (1.0 - 2.0 * p) ** days) / 2.0
+        dice = self.dice.random()
+        if dice < none:
+            return
+        if (dice - none < odd) == (self._prior[cell] < 0):
+            # Last visit was to someone new
+            self._prior[cell] = self._new_host(cell)
+        else:
+            self._prior[cell] = -1
+
+
+def _contagious(state: int) -> bool:
+    return state == ASYMPTOMATIC or state == SYMPTOMATIC
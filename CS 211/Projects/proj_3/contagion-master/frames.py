@@ -0,0 +1,82 @@
+"""Write pictures of a running simulation to image files,
+e.g., to make a movie of a headless run.
+
+A FrameWriter listens to a population and, every so many days,
+writes the whole grid as one image (see palette.py) to a numbered
+file:  frame_00010.png, frame_00020.png, ...  No window is needed,
+and each frame is built and written as whole buffers, so frames
+cost milliseconds even for big grids.  Frames are PNG (compressed
+with zlib) or PPM (raw, bigger, a little faster).  To make a movie:
+
+    ffmpeg -framerate 10 -i frames/frame_%05d.png contagion.mp4
+"""
+
+import mvc
+import palette
+
+import numpy as np
+import os
+import struct
+import zlib
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+FORMATS = ["png", "ppm"]
+
+
+def png(pixels: np.ndarray, level: int = 1) -> bytes:
+    """PNG image of height x width x 3 RGB pixels.  Low
+    compression levels are much faster and not much bigger for
+    pictures made of a few flat colors.
+    """
+    height, width, _ = pixels.shape
+    # Each row of the image data starts with its filter type, 0 (none)
+    rows = np.zeros((height, 1 + 3 * width), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, 3 * width)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n"
+            + _chunk(b"IHDR", header)
+            + _chunk(b"IDAT", zlib.compress(rows.tobytes(), level))
+            + _chunk(b"IEND", b""))
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data)))
+
+
+class FrameWriter(mvc.Listener):
+    """Writes a picture of the population to directory every
+    'every' days.  Pictures are width x height pixels, by default
+    one pixel per cell.
+    """
+
+    def __init__(self, population: mvc.Listenable, directory: str,
+                 every: int = 1, width: int = None, height: int = None,
+                 format: str = "png"):
+        if format not in FORMATS:
+            raise ValueError(f"Frame format must be one of {FORMATS}, not '{format}'")
+        self.directory = directory
+        self.every = every
+        self.width = width or population.ncols
+        self.height = height or population.nrows
+        self.format = format
+        os.makedirs(directory, exist_ok=True)
+        population.add_listener(self)
+
+    def notify(self, subject: mvc.Listenable, event: str):
+        if event == "timestep" and subject.day % self.every == 0:
+            self.write(subject.state_grid(), subject.day)
+
+    def write(self, states: np.ndarray, day: int) -> str:
+        """Picture of states, in the frame file for day"""
+        pixels = palette.rasterize(states, self.width, self.height)
+        data = png(pixels) if self.format == "png" else palette.ppm(pixels)
+        path = os.path.join(self.directory, f"frame_{day:05d}.{self.format}")
+        with open(path, "wb") as f:
+            f.write(data)
+        log.debug(f"Wrote {path}")
+        return path
@@ -46,6 +46,10 @@ class Grid(object):
         self.cell_width = width / ncols
         self.cell_height = height / nrows
         self._last_update = time.time()
+        # One rectangle per cell, created the first time the cell is
+        # filled and recolored after that, so the canvas doesn't fill
+        # up with rectangles piled on top of each other
+        self._marks: typing.Dict[typing.Tuple[int, int], Rectangle] = {}
 
     def update(self, rate=None):
         """When autoflush is false, call 'update' to update the display.
@@ -73,6 +77,14 @@ class Grid(object):
            in the grid. 
         color: What color to fill fill the selecte cell with.  
         """
+        mark = self._marks.get((row, col))
+        if mark is not None:
+            # Recolor in place.  setFill sends all of the options to
+            # the canvas in one call, border included.
+            mark.config["outline"] = border_color
+            mark.config["width"] = border_width
+            mark.setFill(color)
+            return
         left = col * self.cell_width
         right = (col + 1) * self.cell_width
         top = row * self.cell_height
@@ -82,6 +94,7 @@ class Grid(object):
         mark.setOutline(border_color)
         mark.setWidth(border_width)
         mark.draw(self.win)
+        self._marks[(row, col)] = mark
 
     def label_cell(self, row, col, text, color=BLACK):
         """Place text label on cell[row,col].
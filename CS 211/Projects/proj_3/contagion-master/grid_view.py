@@ -6,21 +6,21 @@ position of the cell in the grid.
 """
 
 import graphics.grid
+import graphics.graphics
 from graphics.graphics import color_rgb
 import mvc
 import model
+import array_model
+import palette
+
+import time
+import numpy as np
 
 import logging
 logging.basicConfig()
 log = logging.getLogger("__name__")
 
-STATE_COLORS = {
-    model.Health.vulnerable: color_rgb(0, 200, 100),
-    model.Health.asymptomatic: color_rgb(50, 200, 200),
-    model.Health.symptomatic: color_rgb(250, 200, 250),
-    model.Health.recovered: color_rgb(50, 150, 50),
-    model.Health.dead: color_rgb(0, 0, 0)
-}
+STATE_COLORS = {state: color_rgb(*rgb) for state, rgb in palette.STATE_RGB.items()}
 
 
 class GridView(graphics.grid.Grid):
@@ -43,7 +43,7 @@ class CellView(mvc.Listener):
 
     def notify(self, subject: mvc.Listenable, event: str):
         """Update view of this cell. """
-        assert isinstance(subject, model.Individual)  # because argument type is too general
+        assert isinstance(subject, (model.Individual, array_model.Cell))  # because argument type is too general
         if event == "newstate":
             color = STATE_COLORS[subject.state]
             self.grid_view.fill_cell(self.row, self.col, color)
@@ -51,10 +51,76 @@ class CellView(mvc.Listener):
             log.warning(f"CellView does not handle event type '{event}'")
 
 
+class PopulationView(mvc.Listener):
+    """View of the whole grid, listening to the population
+    rather than to each cell:  one "changes" event per step
+    lists the cells to recolor.  Or, without listening, shown
+    whole grids of states (e.g., simulation snapshots) and
+    recoloring the cells that differ from the last one shown.
+    """
 
+    def __init__(self, grid_view: GridView):
+        self.grid_view = grid_view
+        self._shown = None
 
+    def show(self, states):
+        """Redraw from an nrows x ncols array of state values"""
+        if self._shown is None:
+            rows, cols = np.indices(states.shape)
+            changed = zip(rows.ravel(), cols.ravel())
+        else:
+            changed = zip(*np.nonzero(states != self._shown))
+        for row, col in changed:
+            if states[row, col] == model.EMPTY:
+                continue    # Background
+            color = STATE_COLORS[model.Health(int(states[row, col]))]
+            self.grid_view.fill_cell(int(row), int(col), color)
+        self._shown = states.copy()
 
-        
-
-
+    def notify(self, subject: mvc.Listenable, event: str):
+        if event == "changes":
+            ncols = subject.ncols
+            for i in subject.last_changes:
+                row, col = divmod(int(i), ncols)
+                color = STATE_COLORS[subject.state_at(row, col)]
+                self.grid_view.fill_cell(row, col, color)
+        elif event != "timestep":
+            log.warning(f"PopulationView does not handle event type '{event}'")
+
+
+class RasterView(mvc.Listener):
+    """View of the whole grid as one image, for grids with
+    about as many cells as the window has pixels (or more).
+    Every timestep the image is redrawn from the population's
+    state array in one go, so a frame costs the same however
+    many cells changed.
+    """
+
+    def __init__(self, width: int, height: int, title: str = "Untitled"):
+        self.width = width
+        self.height = height
+        self.win = graphics.graphics.GraphWin(title, width, height, autoflush=False)
+        self.image = graphics.graphics.Image(graphics.graphics.Point(width / 2, height / 2),
+                                             width, height)
+        self.image.draw(self.win)
+        self._last_update = time.time()
 
+    def notify(self, subject: mvc.Listenable, event: str):
+        if event == "changes":
+            if len(subject.last_changes) > 0:
+                self.show(subject.state_grid())
+        elif event != "timestep":
+            log.warning(f"RasterView does not handle event type '{event}'")
+
+    def show(self, states):
+        """Redraw from an nrows x ncols array of state values"""
+        pixels = palette.rasterize(states, self.width, self.height)
+        self.image.img.configure(data=palette.ppm(pixels), format="PPM")
+
+    def update(self, rate=None):
+        """Same as graphics.grid.Grid.update"""
+        if rate:
+            if time.time() < self._last_update + 1/rate:
+                return
+        self.win.update()
+        self._last_update = time.time()
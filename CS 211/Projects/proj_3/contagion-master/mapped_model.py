@@ -0,0 +1,217 @@
+"""Array population kept in memory-mapped files, for grids too
+big to fit in memory.
+
+Same model and the same arrays as ArrayPopulation, but each array
+is a .npy file in a directory, mapped into memory with numpy.memmap,
+so the operating system keeps in RAM only the parts in use.  The
+population is built and stepped a chunk of rows at a time, like the
+bands of parallel_model, so no step needs whole-grid temporaries:
+first every chunk decides, then every chunk commits.
+
+After every step the directory's population.json says what day it
+is and how many are in each state, so another process can watch a
+run as it goes:
+
+    info, states = mapped_model.peek("run_dir")
+
+and a population that was closed can be picked up again with
+MappedPopulation.reopen("run_dir").
+"""
+
+import array_model
+import adjacency
+import model
+import mvc
+import profiling
+from array_model import KINDS, STATES, VULNERABLE
+from model import Health, Params
+
+import numpy as np
+import json
+import os
+import shutil
+import tempfile
+import weakref
+from typing import Dict, Iterator, Tuple
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+# About how many cells to work on at once
+CHUNK = 2 ** 20
+INFO = "population.json"
+# Per-cell arrays, besides the neighbor table
+ARRAYS = ["kind", "state", "time_in_state", "prior_visit", "next_state", "infected"]
+
+
+class MappedPopulation(array_model.ArrayPopulation):
+    """ArrayPopulation whose arrays live in files in directory
+    (by default a temporary directory, removed by close).
+    """
+
+    def __init__(self, nrows: int, ncols: int, seed: model.Seed = None,
+                 directory: str = None, chunk_rows: int = None):
+        mvc.Listenable.__init__(self)
+        self.nrows = nrows
+        self.ncols = ncols
+        self.day = 0
+        self.seed_sequence = model.seed_sequence(seed)
+        self.rng = np.random.default_rng(self.seed_sequence)
+        self._set_params([Params.from_config(kind) for kind in KINDS])
+        self._use_directory(directory)
+        self.chunk = (chunk_rows or max(1, CHUNK // ncols)) * ncols
+        n = nrows * ncols
+
+        weights = array_model._kind_weights()
+        self.kind = self._create("kind", n, np.int8)
+        for lo, hi in self.chunks():
+            self.kind[lo:hi] = self.rng.choice(len(KINDS), size=hi - lo, p=weights)
+        # Neighbor table in two passes:  how many each, then who
+        with profiling.phase("build.neighbors"):
+            start = self._create("start", n + 1, np.int64)
+            for lo, hi in self.chunks():
+                kind = self.kind[lo:hi]
+                counts = adjacency.neighbor_counts(nrows, ncols, lo, hi,
+                                                   self.N_Neighbors[kind], self.Visit_Dist[kind])
+                start[lo + 1:hi + 1] = start[lo] + np.cumsum(counts)
+            index = self._create("index", int(start[n]), adjacency.index_dtype(n))
+            for lo, hi in self.chunks():
+                kind = self.kind[lo:hi]
+                adjacency.choose_neighbors(nrows, ncols, lo, hi,
+                                           self.N_Neighbors[kind], self.Visit_Dist[kind],
+                                           start, index, self.rng)
+        self.adjacency = adjacency.Adjacency(start, index)
+
+        # New files are all zeros
+        self.state = self._create("state", n, np.int8)
+        self.time_in_state = self._create("time_in_state", n, np.int32)
+        self.prior_visit = self._create("prior_visit", n, adjacency.index_dtype(n))
+        self.next_state = self._create("next_state", n, np.int8)
+        self.infected = self._create("infected", n, np.bool_)
+        for lo, hi in self.chunks():
+            self.state[lo:hi] = VULNERABLE
+            self.prior_visit[lo:hi] = -1
+        self._recount()
+        self._cells = None
+        self.last_changes = np.zeros(0, dtype=np.intp)
+        self._save_info()
+
+    @classmethod
+    def reopen(cls, directory: str, chunk_rows: int = None) -> "MappedPopulation":
+        """Carry on with a population that was closed, from the
+        files it left in directory
+        """
+        with open(os.path.join(directory, INFO)) as f:
+            info = json.load(f)
+        population = cls.__new__(cls)
+        mvc.Listenable.__init__(population)
+        population.nrows = info["nrows"]
+        population.ncols = info["ncols"]
+        population.day = info["day"]
+        entropy, spawn_key = info["seed"]
+        population.seed_sequence = np.random.SeedSequence(entropy, spawn_key=tuple(spawn_key))
+        population.rng = np.random.default_rng(population.seed_sequence)
+        population.rng.bit_generator.state = info["rng"]
+        population._set_params([Params(**p) for p in info["params"]])
+        population.directory = directory
+        population._finalizer = None
+        population.chunk = (chunk_rows or max(1, CHUNK // population.ncols)) * population.ncols
+        for name in ARRAYS:
+            setattr(population, name, population._map(name))
+        population.adjacency = adjacency.Adjacency(population._map("start"),
+                                                   population._map("index"))
+        population._recount()
+        population._cells = None
+        population.last_changes = np.zeros(0, dtype=np.intp)
+        return population
+
+    def _use_directory(self, directory: str):
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="contagion-")
+            self._finalizer = weakref.finalize(self, shutil.rmtree, directory, True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self._finalizer = None
+        self.directory = directory
+
+    def _create(self, name: str, size: int, dtype) -> np.memmap:
+        path = os.path.join(self.directory, f"{name}.npy")
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(size,))
+
+    def _map(self, name: str) -> np.memmap:
+        return np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r+")
+
+    def chunks(self) -> Iterator[Tuple[int, int]]:
+        """Ranges of cell numbers, a chunk of whole rows each"""
+        n = self.nrows * self.ncols
+        for lo in range(0, n, self.chunk):
+            yield lo, min(lo + self.chunk, n)
+
+    def _recount(self):
+        """Live counts, as in ArrayPopulation, a chunk at a time"""
+        counts = np.zeros(len(KINDS) * STATES, dtype=np.int64)
+        for lo, hi in self.chunks():
+            counts += np.bincount(array_model._kind_state(self.kind[lo:hi], self.state[lo:hi]),
+                                  minlength=counts.size)
+        self._kind_counts = counts.reshape(len(KINDS), STATES)
+        self._counts = self._kind_counts.sum(axis=0)
+
+    def step(self):
+        """Determine next states, then time passes, a chunk at a time"""
+        log.debug("MappedPopulation: Step")
+        with profiling.phase("step.decide"):
+            for lo, hi in self.chunks():
+                self._decide(lo, hi, self.rng)
+        changes = []
+        with profiling.phase("step.commit"):
+            for lo, hi in self.chunks():
+                changed, was = self._commit(lo, hi)
+                self._tally(changed, was)
+                changes.append(changed)
+        with profiling.phase("step.notify"):
+            self._notify(np.concatenate(changes))
+            self.day += 1
+            self.notify_all("timestep")
+        with profiling.phase("step.save"):
+            self._save_info()
+
+    def _save_info(self):
+        """What day it is, counts, and all we need to reopen"""
+        info = {"nrows": self.nrows, "ncols": self.ncols, "day": self.day,
+                "counts": {state.name: self.count_in_state(state) for state in Health},
+                "seed": [self.seed_sequence.entropy, list(self.seed_sequence.spawn_key)],
+                "rng": self.rng.bit_generator.state,
+                "params": [p._asdict() for p in self.params]}
+        path = os.path.join(self.directory, INFO)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(info, f)
+        os.replace(f"{path}.tmp", path)
+
+    def flush(self):
+        """Make sure the files are up to date on disk"""
+        for name in ARRAYS:
+            getattr(self, name).flush()
+        self.adjacency.start.flush()
+        self.adjacency.index.flush()
+
+    def close(self):
+        """Done with the population.  A temporary directory is
+        removed; otherwise the files stay, to reopen or inspect.
+        """
+        self._save_info()
+        self.flush()
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+def peek(directory: str) -> Tuple[Dict, np.ndarray]:
+    """From any process, a look at a population in directory:  its
+    population.json, and its health states as a read-only nrows x
+    ncols array that follows the run as it goes
+    """
+    with open(os.path.join(directory, INFO)) as f:
+        info = json.load(f)
+    state = np.load(os.path.join(directory, "state.npy"), mmap_mode="r")
+    return info, state.reshape(info["nrows"], info["ncols"])
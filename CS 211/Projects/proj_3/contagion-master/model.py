@@ -1,17 +1,68 @@
 
 import mvc
 import enum
-from typing import List, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 import random
 import config
+import adjacency
+import profiling
+
+import numpy as np
 
 
 import logging
 logging.basicConfig()
 log = logging.getLogger(__name__)
-log.setLevel(logging.DEBUG)
+log.setLevel(logging.WARN)
+
+
+# A population's random choices all derive from one seed:  an int,
+# a numpy SeedSequence (e.g., one of those from streams()), or None
+# for a fresh unpredictable seed.
+Seed = Optional[Union[int, np.random.SeedSequence]]
+
+
+def seed_sequence(seed: Seed) -> np.random.SeedSequence:
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
 
 
+def streams(root_seed: Seed, n: int) -> List[np.random.SeedSequence]:
+    """Seeds for n independent runs (replicates, workers, ...),
+    all determined by root_seed.  Unlike SeedSequence.spawn,
+    asking again gives the same seeds.
+    """
+    root = seed_sequence(root_seed)
+    return [np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (i,))
+            for i in range(n)]
+
+
+class Params(NamedTuple):
+    """Configuration parameters for one kind of individual.
+    Read from the configuration once per kind and shared by
+    every individual of that kind.
+    """
+    T_Incubate: int
+    P_Transmit: float
+    T_Recover: int
+    P_Death: float
+    P_Greet: float
+    N_Neighbors: int
+    P_Visit: float
+    Visit_Dist: int
+
+    @classmethod
+    def from_config(cls, kind: str) -> "Params":
+        return cls(T_Incubate=config.get_int(kind, "T_Incubate"),
+                   P_Transmit=config.get_float(kind, "P_Transmit"),
+                   T_Recover=config.get_int(kind, "T_Recover"),
+                   P_Death=config.get_float(kind, "P_Death"),
+                   P_Greet=config.get_float(kind, "P_Greet"),
+                   N_Neighbors=config.get_int(kind, "N_Neighbors"),
+                   P_Visit=config.get_float(kind, "P_Visit"),
+                   Visit_Dist=config.get_int(kind, "Visit_Dist"))
+
 
 class Individual(mvc.Listenable):
     """An individual in the population,
@@ -20,6 +71,13 @@ class Individual(mvc.Listenable):
     listeners can check it.
     """
 
+    # A big population has millions of individuals, so each one
+    # keeps only what is its own, in slots rather than a __dict__:
+    # parameters are shared by every individual of a kind, and the
+    # neighbors of everyone are in one table kept by the region.
+    __slots__ = ("kind", "region", "row", "col", "_time_in_state",
+                 "state", "next_state", "params", "prior_visit")
+
     def __init__(self, kind: str, region: 'Population', row: int, col: int):
         # Listener needs its own initialization
         super().__init__()
@@ -32,44 +90,46 @@ class Individual(mvc.Listenable):
         self.state = Health.vulnerable
         self.next_state = Health.vulnerable
         # Configuration parameters based on kind
-        self.T_Incubate = config.get_int(kind, "T_Incubate")
-        self.P_Transmit = config.get_float(kind, "P_Transmit")
-        self.T_Recover = config.get_int(kind, "T_Recover")
-        self.P_Death = config.get_float(kind, "P_Death")
-        self.P_Greet = config.get_float(kind, "P_Greet")
-        self.N_Neighbors = config.get_int(kind, "N_Neighbors")
-        self.P_Visit = config.get_float(kind, "P_Visit")
-        self.Visit_Dist = config.get_int(kind, "Visit_Dist")
-        self.neighbors = region.neighbors(num=self.N_Neighbors,row=row, col=col,dist=self.Visit_Dist)
+        self.params = region.params_for(kind)
         self.prior_visit = None
 
-    def step(self):
-        """Next state"""
+    @property
+    def neighbors(self) -> List[Tuple[int, int]]:
+        """Addresses of the neighbors we may visit"""
+        return self.region.neighbors(self.row, self.col)
+
+    def step(self, visits: Optional[bool] = None):
+        """Next state.  visits says whether we pay a visit today,
+        if the population has already rolled the dice for that.
+        """
         # Basic state transitions are in common
         if self.state == Health.asymptomatic:
-            if self._time_in_state > self.T_Incubate:
+            if self._time_in_state > self.params.T_Incubate:
                 self.next_state = Health.symptomatic
                 log.debug("Becoming symptomatic")
         if self.state == Health.symptomatic:
             # We could die on any time step before we recover
-            if self._time_in_state > self.T_Recover:
+            if self._time_in_state > self.params.T_Recover:
                 log.debug(f"Recovery at {self.row},{self.col}")
                 self.next_state = Health.recovered
-            elif random.random() < self.P_Death:
+            elif self.region.rng.random() < self.params.P_Death:
                 log.debug(f"Death at {self.row},{self.col}")
                 self.next_state = Health.dead
 
         # Social behavior differs among concrete classes
-        self.social_behavior()
+        self.social_behavior(visits)
 
-    def tick(self):
-        """Time passes"""
+    def tick(self) -> bool:
+        """Time passes.  True if our state changed."""
         self._time_in_state += 1
         if self.state != self.next_state:
+            self.region.tally(self.kind, self.state, self.next_state)
             self.state = self.next_state
             self.notify_all("newstate")
             # Reset clock
             self._time_in_state = 0
+            return True
+        return False
 
     def meet(self, other: "Individual"):
         """Two individuals meet.  Either may infect
@@ -84,7 +144,7 @@ class Individual(mvc.Listenable):
             if not other.state == Health.vulnerable:
                 return
             # Transmission is possible.  Roll the dice
-            if random.random() < self.P_Transmit:
+            if self.region.rng.random() < self.params.P_Transmit:
                 other.infect()
 
     def _is_contagious(self) -> bool:
@@ -98,9 +158,15 @@ class Individual(mvc.Listenable):
         """True means 'welcome' and False means 'go away'"""
         raise NotImplementedError("Each class must implement 'hello'")
 
-    def social_behavior(self):
+    def social_behavior(self, visits: Optional[bool] = None):
         raise NotImplementedError("Social behavior should be implemented in subclasses")
 
+    def _visits_today(self, visits: Optional[bool]) -> bool:
+        """Roll the dice for a visit, unless they were rolled already"""
+        if visits is None:
+            return self.region.rng.random() < self.params.P_Visit
+        return visits
+
     def infect(self):
         """Called by another individual spreading germs.
         May also be called on "patient 0" to start simulation.
@@ -112,21 +178,24 @@ class Typical(Individual):
     """Typical individual. May visit different neighbors
     each day.
     """
+    __slots__ = ()
+
     def __init__(self, region: 'Population', row: int, col: int):
         # Much of the constructor has been "factored out" into
         # the abstract base class
         super().__init__("Typical", region, row, col)
 
     
-    def social_behavior(self):
+    def social_behavior(self, visits: Optional[bool] = None):
         """The way an AtRisk individual interacts with neighbors"""
-        if random.random() >= self.P_Visit:
+        if not self._visits_today(visits):
             # No visits today! 
             return
         if self.prior_visit is None:
             # Time for someone new
-            addr = random.choice(self.neighbors)
-            neighbor = self.region.visit(addr)
+            neighbor = self.region.random_neighbor(self)
+            if neighbor is None:
+                return   # Nobody near enough to visit
             self.prior_visit = neighbor
         else:
             # Second visit to the same person
@@ -149,25 +218,33 @@ class Health(enum.Enum):
 
     def __str__(self) -> str:
         return self.name
+
+
+# State value, in a grid of state values, of a cell nobody is in
+# (the end of a last row that isn't full, in a network's layout)
+EMPTY = 0
     
 class AtRisk(Individual):
     """Immunocompromised or elderly.
     Vulnerable and cautious.
     """
+    __slots__ = ()
+
     def __init__(self, region: "Population", row: int, col: int):
         # Much of the constructor has been "factored out" into
         # the abstract base class
         super().__init__("AtRisk", region, row, col)
 
-    def social_behavior(self):
+    def social_behavior(self, visits: Optional[bool] = None):
         """The way an AtRisk individual interacts with neighbors"""
-        if random.random() >= self.P_Visit:
+        if not self._visits_today(visits):
             # No visits today! 
             return
         if self.prior_visit is None:
             # Time for someone new
-            addr = random.choice(self.neighbors)
-            neighbor = self.region.visit(addr)
+            neighbor = self.region.random_neighbor(self)
+            if neighbor is None:
+                return   # Nobody near enough to visit
             self.prior_visit = neighbor
         else:
             # Second visit to the same person
@@ -178,47 +255,214 @@ class AtRisk(Individual):
     
     def hello(self, visitor: "Individual") -> bool:
         """True means 'welcome' and False means 'go away'"""
-        if visitor in self.neighbors:
-            return True
-        return False
+        return self.region.is_neighbor(self, visitor)
 
 class Wanderer(Individual):
+    __slots__ = ()
+
     def __init__(self, kind:"str", region:"Population", row:int, col:int):
         super().__init__(kind, region, row, col)
 
+# Kinds of individual in a Population.  The code for a kind is its
+# position in this list.  Configuration sections are named for the
+# classes.
+KINDS = [AtRisk, Typical]
+
+
 class Population(mvc.Listenable):
-    def __init__(self, nrows: int, ncols: int):
+    """Grid of individuals.  With block_random, each step rolls
+    everyone's visit dice at once, and individuals with nothing
+    else to do that day (not contagious, not visiting) are
+    skipped.  Same model, but a different run for the same seed.
+    Neighbors are chosen from the configuration unless a table
+    of them is given (e.g., a contact network).
+    """
+
+    def __init__(self, nrows: int, ncols: int, seed: Seed = None,
+                 block_random: bool = False, table: adjacency.Adjacency = None):
         super().__init__()
-        self.cells = []
         self.nrows = nrows
         self.ncols = ncols
-        # Populate according to config
-        for row_i in range(nrows):
+        self.day = 0
+        # Cells that changed state in the last step, for
+        # listeners to the "changes" event
+        self.last_changes: List[int] = []
+        self._params: Dict[str, Params] = {}
+        # One stream for individuals' dice rolls, one for
+        # building the neighbor table
+        self.seed_sequence = seed_sequence(seed)
+        dice_seed, table_seed = streams(self.seed_sequence, 2)
+        self.rng = random.Random(dice_seed.generate_state(4).tobytes())
+        # Populate according to config.  Choose each individual's
+        # kind first, so that neighbors for everyone can be chosen
+        # in one pass before the individuals are created.
+        proportions = [config.get_float("Grid", f"Proportion_{the_class.__name__}")
+                       for the_class in KINDS]
+        n = nrows * ncols if table is None else len(table)
+        kinds = [self._random_kind(proportions) for _ in range(n)]
+        params = [self.params_for(the_class.__name__) for the_class in KINDS]
+        if table is None:
+            num = np.array([p.N_Neighbors for p in params])
+            dist = np.array([p.Visit_Dist for p in params])
+            table = adjacency.grid_adjacency(nrows, ncols, num[kinds], dist[kinds],
+                                             np.random.default_rng(table_seed))
+        with profiling.phase("build.individuals"):
+            self._populate(kinds, table)
+        self.block_random = False
+        if block_random:
+            self._use_block_random()
+
+    def _use_block_random(self):
+        """Roll visit dice for everyone at once, from a stream of
+        their own (see step)
+        """
+        self.block_random = True
+        self._individuals = [cell for row in self.cells for cell in row]
+        self._p_visit = np.array([cell.params.P_Visit for cell in self._individuals])
+        self._visit_dice = np.random.default_rng(streams(self.seed_sequence, 3)[2])
+
+    def _populate(self, kinds: List[int], table: adjacency.Adjacency):
+        """One vulnerable individual of kind kinds[i] in each cell i,
+        with neighbors from table.  If there are fewer than nrows x
+        ncols, the last row is cut short.
+        """
+        self.adjacency = table
+        # Individuals look up their neighbors one at a time, which
+        # is much faster through memoryviews than numpy indexing
+        self._start = memoryview(table.start)
+        self._index = memoryview(table.index)
+        self.cells = []
+        for row_i in range(self.nrows):
             row = []
-            for col_i in range(ncols):
-                row.append(self._random_individual(row_i, col_i))
+            for col_i in range(min(self.ncols, len(kinds) - row_i * self.ncols)):
+                the_class = KINDS[kinds[row_i * self.ncols + col_i]]
+                row.append(the_class(self, row_i, col_i))
             self.cells.append(row)
-        return
+        self._recount()
+
+    def _recount(self):
+        """Live count of individuals in each state, overall and by
+        kind.  Kept up to date by Individual.tick, so counting is free.
+        """
+        self._counts = {state: 0 for state in Health}
+        self._kind_counts = {the_class.__name__: {state: 0 for state in Health}
+                             for the_class in KINDS}
+        for row in self.cells:
+            for cell in row:
+                self._counts[cell.state] += 1
+                self._kind_counts[cell.kind][cell.state] += 1
+
+    def checkpoint_state(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """Everything needed to pick up where we left off (see checkpoint.py):
+        fields that go in the header, and one array entry per individual.
+        """
+        individuals = [cell for row in self.cells for cell in row]
+        code = {the_class: i for i, the_class in enumerate(KINDS)}
+        version, internal, gauss = self.rng.getstate()
+        fields = {"nrows": self.nrows, "ncols": self.ncols, "day": self.day,
+                  "seed": [self.seed_sequence.entropy, list(self.seed_sequence.spawn_key)],
+                  "params": [self.params_for(the_class.__name__)._asdict()
+                             for the_class in KINDS],
+                  "rng": [version, list(internal), gauss],
+                  "block_random": self.block_random}
+        if self.block_random:
+            fields["visit_dice"] = self._visit_dice.bit_generator.state
+        arrays = {
+            "kind": np.array([code[type(cell)] for cell in individuals], dtype=np.int8),
+            "state": np.array([cell.state.value for cell in individuals], dtype=np.int8),
+            "time_in_state": np.array([cell._time_in_state for cell in individuals],
+                                      dtype=np.int32),
+            "prior_visit": np.array([-1 if cell.prior_visit is None
+                                     else cell.prior_visit.row * self.ncols + cell.prior_visit.col
+                                     for cell in individuals], dtype=np.int32),
+            "start": self.adjacency.start, "index": self.adjacency.index}
+        return fields, arrays
+
+    @classmethod
+    def from_checkpoint(cls, fields: dict, arrays: Dict[str, np.ndarray]) -> "Population":
+        """Population as it was when checkpoint_state was called"""
+        population = cls.__new__(cls)
+        mvc.Listenable.__init__(population)
+        population.nrows = fields["nrows"]
+        population.ncols = fields["ncols"]
+        population.day = fields["day"]
+        population.last_changes = []
+        entropy, spawn_key = fields["seed"]
+        population.seed_sequence = np.random.SeedSequence(entropy, spawn_key=tuple(spawn_key))
+        population.rng = random.Random()
+        version, internal, gauss = fields["rng"]
+        population.rng.setstate((version, tuple(internal), gauss))
+        population._params = {the_class.__name__: Params(**p)
+                               for the_class, p in zip(KINDS, fields["params"])}
+        population._populate(arrays["kind"].tolist(),
+                             adjacency.Adjacency(np.array(arrays["start"]),
+                                                 np.array(arrays["index"])))
+        individuals = [cell for row in population.cells for cell in row]
+        for cell, state, time, prior in zip(individuals, arrays["state"].tolist(),
+                                            arrays["time_in_state"].tolist(),
+                                            arrays["prior_visit"].tolist()):
+            cell.state = cell.next_state = Health(state)
+            cell._time_in_state = time
+            if prior >= 0:
+                cell.prior_visit = individuals[prior]
+        population._recount()
+        population.block_random = False
+        if fields.get("block_random"):
+            population._use_block_random()
+            population._visit_dice.bit_generator.state = fields["visit_dice"]
+        return population
 
     def step(self):
         """Determine next states"""
         log.debug("Population: Step")
         # Time passes
-        for row in self.cells:
-            for cell in row:
-                cell.step()
-        for row in self.cells:
-            for cell in row:
-                cell.tick()
-        self.notify_all("timestep")
+        with profiling.phase("step.decide"):
+            if self.block_random:
+                self._step_visitors()
+            else:
+                for row in self.cells:
+                    for cell in row:
+                        cell.step()
+        changes = []
+        with profiling.phase("step.commit"):
+            for row in self.cells:
+                for cell in row:
+                    if cell.tick():
+                        changes.append(cell.row * self.ncols + cell.col)
+        with profiling.phase("step.notify"):
+            self._notify_changes(changes)
+            self.day += 1
+            self.notify_all("timestep")
+
+    def _step_visitors(self):
+        """Individual.step, but with one draw for everyone's visit
+        dice, only for those that visit or are contagious:  for
+        anyone else Individual.step would do nothing but roll them
+        """
+        visits = (self._visit_dice.random(self._p_visit.size) < self._p_visit).tolist()
+        for cell, visiting in zip(self._individuals, visits):
+            if (visiting or cell.state is Health.asymptomatic
+                    or cell.state is Health.symptomatic):
+                cell.step(visiting)
+
+    def _notify_changes(self, changes: List[int]):
+        """One "changes" event for all the cells (numbered
+        row * ncols + col) that changed state at once
+        """
+        self.last_changes = changes
+        self.notify_all("changes")
     
 
     def seed(self):
         """Patient zero"""
-        row = random.randint(0,self.nrows-1)
-        col = random.randint(0,self.ncols-1)
+        while True:
+            row = self.rng.randint(0,self.nrows-1)
+            col = self.rng.randint(0,self.ncols-1)
+            if col < len(self.cells[row]):
+                break   # Not off the end of a short last row
         self.cells[row][col].infect()
-        self.cells[row][col].tick()
+        if self.cells[row][col].tick():
+            self._notify_changes([row * self.ncols + col])
     
     def infect(self):
         """Called by another individual spreading germs.
@@ -229,57 +473,72 @@ class Population(mvc.Listenable):
 
     def count_in_state(self, state: Health) -> int:
         """How many individuals are currently in state?"""
-        count = 0
-        for row in self.cells:
-            for cell in row:
-                if cell.state == state:
-                    count += 1
-        return count
+        return self._counts[state]
+
+    def counts(self) -> Dict[Health, int]:
+        """Snapshot of how many individuals are in each state"""
+        return dict(self._counts)
 
-    def _random_individual(self, row: int, col: int) -> "Individual":
-        classes = [(AtRisk, config.get_float("Grid", "Proportion_AtRisk")),
-                   (Typical, config.get_float("Grid", "Proportion_Typical"))]
+    def counts_by_kind(self) -> Dict[str, Dict[Health, int]]:
+        """Snapshot of how many individuals of each kind are in each state"""
+        return {kind: dict(counts) for kind, counts in self._kind_counts.items()}
+
+    def tally(self, kind: str, old: Health, new: Health):
+        """An individual of kind has moved from state old to state new"""
+        self._counts[old] -= 1
+        self._counts[new] += 1
+        self._kind_counts[kind][old] -= 1
+        self._kind_counts[kind][new] += 1
+
+    def params_for(self, kind: str) -> Params:
+        """Parameters shared by every individual of this kind"""
+        if kind not in self._params:
+            self._params[kind] = Params.from_config(kind)
+        return self._params[kind]
+
+    def _random_kind(self, proportions: List[float]) -> int:
+        """Roll the dice for each kind in turn until one sticks"""
         while True:
-            for the_class, proportion in classes:
-                dice = random.random()
+            for kind, proportion in enumerate(proportions):
+                dice = self.rng.random()
                 if dice < proportion:
-                    return the_class(self, row, col)
-                
-    def neighbors(self, num: int, row: int, col: int, dist: int) -> List[Tuple[int, int]]:
-        """Give me addresses of up to num neighbors
-        up to dist away from here(Manhattan distance)
+                    return kind
+
+    def state_at(self, row: int, col: int) -> Health:
+        return self.cells[row][col].state
+
+    def state_grid(self) -> np.ndarray:
+        """Health state value of every cell, as an nrows x ncols array
+        (EMPTY where nobody is)
         """
-        result = []
-        count = 0
-        log.debug(f"Cell {row},{col} finding {num} neighbors at distance {dist} " +
-                  f"in {self.nrows},{self.ncols}")
-        attempts = 0
-        while count < num:
-            attempts += 1
-            assert attempts < 1000,(
-                f"Can't find {num} neighbors at distance {dist}")
-            row_step = random.randint(0-dist,dist)
-            col_step = random.randint(0-dist,dist)
-            row_addr = row + row_step
-            col_addr = col + col_step
-            # log.debug(f"Trying neighbor at position {row_addr},{col_addr}")
-            if row_addr < 0 or row_addr >= self.nrows:
-                # log.debug("Bad row")
-                continue
-            if col_addr < 0 or col_addr >= self.ncols:
-                # log.debug("Bad column")
-                continue
-            if row_addr == row and col_addr == 0:
-                # log.debug("Can't visit self")
-                continue
-            neighbor_addr = (row_addr, col_addr)
-            if neighbor_addr in result:
-                continue
-            log.debug(f"{row},{col} adding neighbor at {row_addr},{col_addr}")
-            result.append(neighbor_addr)
-            count += 1
-        return result
-    
+        states = np.full((self.nrows, self.ncols), EMPTY, dtype=np.int8)
+        for row_i, row in enumerate(self.cells):
+            states[row_i, :len(row)] = [cell.state.value for cell in row]
+        return states
+
+    def neighbors(self, row: int, col: int) -> List[Tuple[int, int]]:
+        """Addresses of the neighbors of the individual at row, col,
+        chosen when the population was built
+        """
+        return adjacency.addresses(self.adjacency, row * self.ncols + col, self.ncols)
+
+    def random_neighbor(self, individual: Individual) -> Optional[Individual]:
+        """One of individual's neighbors, chosen at random,
+        or None if it has none
+        """
+        i = individual.row * self.ncols + individual.col
+        lo, hi = self._start[i], self._start[i + 1]
+        if lo == hi:
+            return None
+        row, col = divmod(self._index[lo + int(self.rng.random() * (hi - lo))], self.ncols)
+        return self.cells[row][col]
+
+    def is_neighbor(self, individual: Individual, other: Individual) -> bool:
+        """Is other one of the neighbors of individual?"""
+        i = individual.row * self.ncols + individual.col
+        return (other.row * self.ncols + other.col
+                in self._index[self._start[i]:self._start[i + 1]].tolist())
+
     def visit(self, address: Tuple[int, int]):
         """Who lives there?"""
         row_num, col_num = address
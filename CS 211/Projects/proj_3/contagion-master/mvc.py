@@ -4,7 +4,7 @@ attaching view components to model components and
 communicating events to view components.
 """
 
-from typing import List
+from typing import Sequence
 
 # Event listeners are in the View component
 class Listener:
@@ -15,13 +15,23 @@ class Listener:
 
 class Listenable:
     """Model components should be listenable, and should notify
-    listeners of significant state changes.
+    listeners of significant state changes.  A component made of
+    many parts may instead notify once for a whole batch of changes,
+    leaving the details in its own attributes for listeners to read
+    (e.g., a population's "changes" event and last_changes).
     """
 
+    # Subclasses with many instances may use slots too
+    __slots__ = ("_listeners",)
+
     def __init__(self):
-        self._listeners: List[Listener] = []
+        # Most components never get a listener, so they all
+        # share one empty tuple until they do
+        self._listeners: Sequence[Listener] = ()
 
     def add_listener(self, listener: Listener):
+        if not self._listeners:
+            self._listeners = []
         self._listeners.append(listener)
 
     def notify_all(self, event: str):
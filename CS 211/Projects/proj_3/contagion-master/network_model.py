@@ -0,0 +1,86 @@
+"""Populations on a contact network rather than a grid.
+
+The network comes from an edge list file, one contact per line:
+
+    # Comments start with '#'
+    17 4
+    4 256
+
+(the format of, e.g., the SNAP network datasets).  Node ids may
+be any integers; they are numbered 0..n-1 in increasing order, and
+node_ids maps those numbers back.  Contacts go both ways unless
+directed.  Each node is one model.Individual, and its neighbors
+are its contacts, kept in one adjacency table as on a grid, so
+N_Neighbors and Visit_Dist don't apply.
+
+Everything else about a Population still works, with nodes laid
+out in rows of ncols in the order of their numbers so that views
+have something to draw (the layout doesn't mean anything).  The
+last row may be short; state_grid shows its empty end as EMPTY.
+"""
+
+import adjacency
+import model
+import profiling
+
+import numpy as np
+import math
+import warnings
+from typing import List, Optional, Tuple
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+
+def read_edges(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Sources and destinations of the edges in an edge list file"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")     # We say so ourselves if it's empty
+        edges = np.loadtxt(path, dtype=np.int64, comments="#", usecols=(0, 1), ndmin=2)
+    if edges.size == 0:
+        raise ValueError(f"No edges in {path}")
+    return edges[:, 0], edges[:, 1]
+
+
+def layout(n: int) -> Tuple[int, int]:
+    """nrows, ncols as near square as they can be for n cells,
+    the last row perhaps not full
+    """
+    ncols = math.isqrt(n - 1) + 1 if n > 1 else 1
+    return -(-n // ncols), ncols
+
+
+class NetworkPopulation(model.Population):
+    """model.Population whose individuals are the nodes of a network"""
+
+    def __init__(self, table: adjacency.Adjacency, seed: model.Seed = None,
+                 node_ids: Optional[np.ndarray] = None, ncols: int = None,
+                 block_random: bool = False):
+        n = len(table)
+        if ncols is None:
+            nrows, ncols = layout(n)
+        elif ncols > 0:
+            nrows = -(-n // ncols)
+        else:
+            raise ValueError(f"Can't lay out {n} nodes in rows of {ncols}")
+        self.node_ids = np.arange(n) if node_ids is None else node_ids
+        super().__init__(nrows, ncols, seed=seed, block_random=block_random, table=table)
+
+    @classmethod
+    def from_file(cls, path: str, seed: model.Seed = None, directed: bool = False,
+                  ncols: int = None, block_random: bool = False) -> "NetworkPopulation":
+        """Population on the network in edge list file path"""
+        with profiling.phase("build.neighbors"):
+            src, dst = read_edges(path)
+            node_ids, numbers = np.unique(np.concatenate([src, dst]), return_inverse=True)
+            table = adjacency.from_edges(numbers[:src.size], numbers[src.size:],
+                                         node_ids.size, directed=directed)
+        log.info(f"{node_ids.size} nodes, {table.index.size} contacts from {path}")
+        return cls(table, seed=seed, node_ids=node_ids, ncols=ncols,
+                   block_random=block_random)
+
+    def contacts(self, node: int) -> List[int]:
+        """Numbers of the nodes node may visit"""
+        return self.adjacency.of(node).tolist()
@@ -0,0 +1,47 @@
+"""Colors of the health states, and pictures of a whole population.
+
+The grid view colors one cell at a time; for big grids we instead
+turn the whole array of states into an image at once:  look up
+every cell's color in a table indexed by state value, then scale
+the picture to the size wanted by repeating cells (when cells are
+bigger than a pixel) or sampling them (when they are smaller).
+"""
+
+from model import EMPTY, Health
+
+import numpy as np
+from typing import Dict, Tuple
+
+STATE_RGB: Dict[Health, Tuple[int, int, int]] = {
+    Health.vulnerable: (0, 200, 100),
+    Health.asymptomatic: (50, 200, 200),
+    Health.symptomatic: (250, 200, 250),
+    Health.recovered: (50, 150, 50),
+    Health.dead: (0, 0, 0)
+}
+
+# Where nobody is, the background
+EMPTY_RGB = (255, 255, 255)
+
+# Color of each state value, as one row of a lookup table
+LOOKUP = np.zeros((max(state.value for state in Health) + 1, 3), dtype=np.uint8)
+LOOKUP[EMPTY] = EMPTY_RGB
+for _state, _rgb in STATE_RGB.items():
+    LOOKUP[_state.value] = _rgb
+
+
+def rasterize(states: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Picture of a grid of state values (nrows x ncols), as
+    height x width RGB pixels.  Each pixel shows the cell under
+    its center.
+    """
+    nrows, ncols = states.shape
+    rows = (np.arange(height) * 2 + 1) * nrows // (2 * height)
+    cols = (np.arange(width) * 2 + 1) * ncols // (2 * width)
+    return LOOKUP[states[rows[:, None], cols]]
+
+
+def ppm(pixels: np.ndarray) -> bytes:
+    """Binary PPM (P6) image of height x width x 3 RGB pixels"""
+    height, width, _ = pixels.shape
+    return b"P6 %d %d 255\n" % (width, height) + np.ascontiguousarray(pixels).tobytes()
@@ -0,0 +1,223 @@
+"""Array population stepped by several worker processes.
+
+The grid is split into bands of whole rows, one per worker.  All
+the per-cell arrays live in shared memory, so a worker can see the
+whole grid, but it decides next states only for its own band and
+commits only its own band.
+
+Individuals may visit up to Visit_Dist rows across a band edge.
+Those rows (the "halo" of a band) are read straight from shared
+memory.  Each day has two phases with a barrier between them:
+
+  decide:  every worker decides next states for its band, reading
+           only current states (its band and its halo).  Infections
+           it causes in a neighboring band are marked in the shared
+           'infected' array rather than written to that band.
+  commit:  every worker commits its own band, including infections
+           marked by other workers.
+
+The barrier is the halo exchange:  no state changes until every
+band has finished reading.  Counts are merged by the main process
+from the changes each worker reports.
+
+Random numbers come from a stream per block of rows, not per
+worker, and bands are made of whole blocks, so a seed gives the
+same run however many workers there are.
+"""
+
+import array_model
+import model
+import profiling
+from adjacency import Adjacency
+
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import weakref
+from typing import Dict, List, Tuple
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+# Per-cell arrays the workers need to see
+SHARED = ["state", "time_in_state", "kind", "prior_visit",
+          "next_state", "infected"]
+# Per-kind parameters the workers need
+PARAMS = ["T_Incubate", "P_Transmit", "T_Recover", "P_Death",
+          "N_Neighbors", "P_Visit", "Visit_Dist"]
+
+# Rows per random number stream
+BLOCK_ROWS = 16
+
+# Where to find an array in shared memory: block name, shape, dtype
+Layout = Tuple[str, Tuple[int, ...], str]
+
+
+class PartitionedPopulation(array_model.ArrayPopulation):
+    """ArrayPopulation whose steps run in parallel, one band
+    of rows per worker process.
+    """
+
+    def __init__(self, nrows: int, ncols: int, seed: model.Seed = None,
+                 workers: int = None, block_rows: int = BLOCK_ROWS):
+        super().__init__(nrows, ncols, seed)
+        self.block_rows = block_rows
+        self._start_workers(workers)
+
+    def _start_workers(self, workers: int = None):
+        """Move the arrays to shared memory and start a worker per band"""
+        # Blocks of rows with a random number stream each, as ranges
+        # of cell numbers
+        rows = range(0, self.nrows, self.block_rows)
+        blocks = [(row * self.ncols, min(row + self.block_rows, self.nrows) * self.ncols)
+                  for row in rows]
+        seeds = model.streams(self.seed_sequence, len(blocks))
+        workers = min(workers or os.cpu_count() or 1, len(blocks))
+        self._blocks: List[shared_memory.SharedMemory] = []
+        layout = {}
+        for name in SHARED:
+            setattr(self, name, self._share(getattr(self, name), name, layout))
+        self.adjacency = Adjacency(self._share(self.adjacency.start, "start", layout),
+                                   self._share(self.adjacency.index, "index", layout))
+        params = {name: getattr(self, name) for name in PARAMS}
+        # Bands of whole blocks
+        cuts = [len(blocks) * w // workers for w in range(workers + 1)]
+        self.bands = [(blocks[first][0], blocks[last - 1][1])
+                      for first, last in zip(cuts[:-1], cuts[1:])]
+        self._block_counts = [last - first for first, last in zip(cuts[:-1], cuts[1:])]
+        self._conns = []
+        self._procs = []
+        for first, last in zip(cuts[:-1], cuts[1:]):
+            ours, theirs = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_worker,
+                                           args=(theirs, layout, params,
+                                                 blocks[first:last], seeds[first:last]),
+                                           daemon=True)
+            proc.start()
+            self._conns.append(ours)
+            self._procs.append(proc)
+        log.info(f"{workers} workers, bands {self.bands}")
+        self._finalizer = weakref.finalize(self, _shut_down,
+                                           self._conns, self._procs, self._blocks)
+
+    def _share(self, array: np.ndarray, name: str, layout: Dict[str, Layout]) -> np.ndarray:
+        """Copy array into shared memory"""
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self._blocks.append(block)
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[...] = array
+        layout[name] = (block.name, array.shape, array.dtype.str)
+        return shared
+
+    def step(self):
+        """Determine next states, then time passes, band by band in parallel"""
+        log.debug("PartitionedPopulation: Step")
+        with profiling.phase("step.decide"):
+            self._all("decide")
+        with profiling.phase("step.commit"):
+            results = self._all("commit")
+            changed = np.concatenate([changed for changed, _ in results])
+            was = np.concatenate([was for _, was in results])
+            self._tally(changed, was)
+        with profiling.phase("step.notify"):
+            self._notify(changed)
+            self.day += 1
+            self.notify_all("timestep")
+
+    def _all(self, command: str) -> list:
+        """Every worker carries out command; wait for all of them"""
+        for conn in self._conns:
+            conn.send((command,))
+        return [conn.recv() for conn in self._conns]
+
+    def checkpoint_state(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        fields, arrays = super().checkpoint_state()
+        fields["block_rows"] = self.block_rows
+        fields["block_rngs"] = [state for states in self._all("rng") for state in states]
+        return fields, arrays
+
+    @classmethod
+    def from_checkpoint(cls, fields: dict, arrays: Dict[str, np.ndarray],
+                        workers: int = None) -> "PartitionedPopulation":
+        population = super().from_checkpoint(fields, arrays)
+        population.block_rows = fields["block_rows"]
+        population._start_workers(workers)
+        rng_states = iter(fields["block_rngs"])
+        for conn, count in zip(population._conns, population._block_counts):
+            conn.send(("set_rng", [next(rng_states) for _ in range(count)]))
+            conn.recv()
+        return population
+
+    def close(self):
+        """Stop the workers and release shared memory"""
+        self._finalizer()
+
+
+def _attach(layout: Dict[str, Layout]) -> Tuple[Dict[str, np.ndarray], list]:
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays, blocks
+
+
+def _worker(conn, layout: Dict[str, Layout], params: Dict[str, np.ndarray],
+            ranges: List[Tuple[int, int]], seeds: List[np.random.SeedSequence]):
+    """Step the cells of a band, blocks of them in ranges, on
+    command from the main process
+    """
+    arrays, blocks = _attach(layout)
+    # The array kernels only need the arrays and parameters, so
+    # borrow them without building a whole population
+    band = array_model.ArrayPopulation.__new__(array_model.ArrayPopulation)
+    for name in SHARED:
+        setattr(band, name, arrays[name])
+    band.adjacency = Adjacency(arrays["start"], arrays["index"])
+    for name, value in params.items():
+        setattr(band, name, value)
+    rngs = [np.random.default_rng(seed) for seed in seeds]
+    lo, hi = ranges[0][0], ranges[-1][1]
+    try:
+        while True:
+            command, *args = conn.recv()
+            if command == "decide":
+                for (block_lo, block_hi), rng in zip(ranges, rngs):
+                    band._decide(block_lo, block_hi, rng)
+                conn.send(None)
+            elif command == "commit":
+                conn.send(band._commit(lo, hi))
+            elif command == "rng":
+                conn.send([rng.bit_generator.state for rng in rngs])
+            elif command == "set_rng":
+                for rng, state in zip(rngs, args[0]):
+                    rng.bit_generator.state = state
+                conn.send(None)
+            else:
+                break
+    finally:
+        del band, arrays
+        for block in blocks:
+            block.close()
+
+
+def _shut_down(conns, procs, blocks):
+    for conn in conns:
+        try:
+            conn.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+    for proc in procs:
+        proc.join(timeout=5)
+        if proc.is_alive():
+            proc.terminate()
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            pass   # Arrays still refer to it; the OS frees it at exit
+        block.unlink()
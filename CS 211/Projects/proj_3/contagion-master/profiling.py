@@ -0,0 +1,128 @@
+"""Where the time goes in a contagion run.
+
+    with profiling.phase("step"):
+        population.step()
+
+times the step and adds it to the "step" phase:  how many times it
+ran, the total and longest times, and a histogram with a bucket
+for each power of two nanoseconds, from which report() estimates
+the median and 99th percentile.  A dotted name is part of another
+phase ("step.decide" is part of "step").
+
+Until enable() is called, phase() just returns one shared
+do-nothing context manager, so the phases marked in the model
+and main loop cost next to nothing when not profiling.  Phases
+are meant to be a step or more of work, not one individual's.
+"""
+
+import contextlib
+import sys
+import time
+from typing import Dict, List, TextIO
+
+_enabled = False
+_started = 0
+_NOTHING = contextlib.nullcontext()
+
+# Buckets of the histograms:  bucket b holds times t (in ns)
+# with 2**(b-1) <= t < 2**b
+BUCKETS = 64
+
+
+class Phase:
+    """Times of one phase"""
+    __slots__ = ("name", "count", "total", "longest", "buckets")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.total = 0      # ns
+        self.longest = 0    # ns
+        self.buckets: List[int] = [0] * BUCKETS
+
+    def add(self, ns: int):
+        self.count += 1
+        self.total += ns
+        if ns > self.longest:
+            self.longest = ns
+        self.buckets[min(ns.bit_length(), BUCKETS - 1)] += 1
+
+    def quantile(self, q: float) -> int:
+        """Time (ns) that fraction q of times are under, to within
+        a factor of two:  the top of the bucket it falls in
+        """
+        wanted = q * self.count
+        seen = 0
+        for b, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= wanted:
+                return min(2 ** b, self.longest)
+        return self.longest
+
+
+# Phases in the order they were first timed
+PHASES: Dict[str, Phase] = {}
+
+
+class _Timer:
+    __slots__ = ("phase", "start")
+
+    def __init__(self, phase: Phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.phase.add(time.perf_counter_ns() - self.start)
+        return False
+
+
+def phase(name: str):
+    """Context manager timing a run of phase name"""
+    if not _enabled:
+        return _NOTHING
+    the_phase = PHASES.get(name)
+    if the_phase is None:
+        the_phase = PHASES[name] = Phase(name)
+    return _Timer(the_phase)
+
+
+def enable():
+    """Start profiling, afresh"""
+    global _enabled, _started
+    PHASES.clear()
+    _started = time.perf_counter_ns()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def report(out: TextIO = sys.stderr):
+    """Table of phases:  how often, how long in all (and as a share
+    of the time since enable), and typical and worst times
+    """
+    wall = max(1, time.perf_counter_ns() - _started)
+    print(f"Profile of {_format(wall)}", file=out)
+    print(f"{'phase':24} {'calls':>8} {'total':>10} {'share':>6} "
+          f"{'mean':>10} {'p50':>10} {'p99':>10} {'max':>10}", file=out)
+    for p in PHASES.values():
+        name = "  " * p.name.count(".") + p.name.rsplit(".", 1)[-1]
+        print(f"{name:24} {p.count:8} {_format(p.total):>10} {p.total / wall:6.1%} "
+              f"{_format(p.total // max(1, p.count)):>10} {_format(p.quantile(0.5)):>10} "
+              f"{_format(p.quantile(0.99)):>10} {_format(p.longest):>10}", file=out)
+
+
+def _format(ns: int) -> str:
+    """Time in ns, in units that suit it"""
+    for unit, scale in (("s", 10 ** 9), ("ms", 10 ** 6), ("us", 10 ** 3)):
+        if ns >= scale:
+            return f"{ns / scale:.3g} {unit}"
+    return f"{ns} ns"
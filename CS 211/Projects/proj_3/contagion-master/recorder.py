@@ -0,0 +1,72 @@
+"""Record the course of a contagion run, day by day.
+
+A Recorder listens to a population and appends one CSV row per
+day:  the count in each health state, then the count in each
+state for each kind of individual.  Rows are buffered and written
+a batch at a time, so a long run (or a long series of runs) never
+holds its whole history in memory.  Appending to an existing file
+continues it, e.g., after resuming from a checkpoint.
+
+Example row headings for the default kinds:
+
+    run,day,vulnerable,...,dead,AtRisk.vulnerable,...,Typical.dead
+"""
+
+import mvc
+from model import Health
+
+import csv
+import os
+from typing import List, TextIO
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+
+class Recorder(mvc.Listener):
+    """Appends a row to a CSV file at every timestep of population.
+    At most 'buffer' rows are held before they are written.
+    """
+
+    def __init__(self, population: mvc.Listenable, path: str,
+                 run: str = "", buffer: int = 256):
+        self.pop = population
+        self.run = run
+        self.buffer = buffer
+        self.kinds = sorted(population.counts_by_kind())
+        self._rows: List[list] = []
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file: TextIO = open(path, "a", newline="")
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(self.header())
+        population.add_listener(self)
+
+    def header(self) -> List[str]:
+        return (["run", "day"] + [state.name for state in Health]
+                + [f"{kind}.{state.name}" for kind in self.kinds for state in Health])
+
+    def notify(self, subject: mvc.Listenable, event: str):
+        if event != "timestep":
+            return
+        counts = subject.counts()
+        by_kind = subject.counts_by_kind()
+        row = [self.run, subject.day] + [counts[state] for state in Health]
+        for kind in self.kinds:
+            row += [by_kind[kind][state] for state in Health]
+        self._rows.append(row)
+        if len(self._rows) >= self.buffer:
+            self.flush()
+
+    def flush(self):
+        """Write out buffered rows"""
+        log.debug(f"Writing {len(self._rows)} rows")
+        self._writer.writerows(self._rows)
+        self._rows.clear()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
@@ -0,0 +1,149 @@
+"""Run a simulation in a thread of its own, so a display can
+keep up however fast or slow the model steps.
+
+The simulation thread steps the population as fast as it can and
+publishes a Snapshot of it after every step.  Frames go in a
+small queue:  when the display falls behind, the oldest frame is
+dropped for the newest, so the display always shows the latest
+state it can and never holds up the model.  Snapshots at the end
+of each epoch go in a queue of their own and are never dropped,
+since the statistics report every one of them.
+
+Only the simulation thread touches the population once it has
+started; the display thread sees nothing but snapshots.
+
+The day-by-day loop itself (step, update statistics, decide
+whether the day ends an epoch) is days(), which headless runs
+use too, so both kinds of run end and report epochs alike.
+"""
+
+import contagion_stats
+import model
+import profiling
+
+import queue
+import threading
+import time
+import numpy as np
+from typing import Callable, Dict, Iterator, NamedTuple, Optional
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.WARN)
+
+# Frames waiting for the display
+FRAMES = 2
+
+
+class Snapshot(NamedTuple):
+    day: int
+    states: np.ndarray               # nrows x ncols health state values
+    counts: Dict[model.Health, int]
+    epoch: int = 0                   # Which epoch this ends, if any
+    last: bool = False               # Nothing will change after this
+
+
+class Day(NamedTuple):
+    day: int
+    epoch: int = 0                   # Which epoch this day ends, if any
+    last: bool = False               # Nothing will change after this
+
+
+def days(population: model.Population, stats: contagion_stats.Stats,
+         done: Callable[[model.Population], bool], epoch_length: int = 10,
+         epoch: int = 0) -> Iterator[Day]:
+    """Step population until done(population), a day at a time,
+    updating stats.  Yields each day after stepping it, and then
+    the last day again once done; the days that end an epoch (every
+    epoch_length days, and the last day if it ends part of one) are
+    numbered after the given epoch.
+    """
+    steps = shown = population.day
+    while True:
+        last = done(population)
+        if not last:
+            steps += 1
+            log.debug(f"Step {steps}")
+            with profiling.phase("step"):
+                population.step()
+            with profiling.phase("stats"):
+                stats.update(day=steps)
+        ends_epoch = steps > shown and (last or steps % epoch_length == 0)
+        if ends_epoch:
+            epoch += 1
+            shown = steps
+        yield Day(steps, epoch if ends_epoch else 0, last)
+        if last:
+            return
+
+
+class Simulation(threading.Thread):
+    """Step population until done(population), a day at a time,
+    updating stats and reporting every epoch days (and at the end).
+    Frames are taken at most rate times a second (every step if
+    rate is None), since copying a big grid isn't free.
+    """
+
+    def __init__(self, population: model.Population, stats: contagion_stats.Stats,
+                 done: Callable[[model.Population], bool], epoch: int = 10,
+                 rate: float = None):
+        super().__init__(name="simulation", daemon=True)
+        self.population = population
+        self.stats = stats
+        self.done = done
+        self.epoch = epoch
+        self.interval = 1 / rate if rate else 0.0
+        self.frames = queue.Queue(maxsize=FRAMES)
+        self.epochs = queue.Queue()
+        self._halt = threading.Event()
+
+    def run(self):
+        next_frame = time.monotonic()
+        if self._halt.is_set():
+            return
+        for day in days(self.population, self.stats, self.done, self.epoch):
+            if day.epoch or time.monotonic() >= next_frame:
+                with profiling.phase("snapshot"):
+                    snapshot = self.snapshot(day.epoch, day.last)
+                if day.epoch:
+                    self.epochs.put(snapshot)
+                self.publish(snapshot)
+                next_frame = time.monotonic() + self.interval
+            if self._halt.is_set():
+                break
+
+    def snapshot(self, epoch: int = 0, last: bool = False) -> Snapshot:
+        """The population as it is now, copied"""
+        return Snapshot(self.population.day, np.array(self.population.state_grid()),
+                        self.population.counts(), epoch, last)
+
+    def publish(self, snapshot: Snapshot):
+        """Queue a frame, dropping the oldest if the display is behind"""
+        try:
+            self.frames.put_nowait(snapshot)
+        except queue.Full:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                pass    # The display just took it
+            # Only this thread adds frames, so there's room now
+            self.frames.put_nowait(snapshot)
+
+    def latest(self, timeout: float = None) -> Optional[Snapshot]:
+        """Newest frame waiting, skipping older ones; None if no
+        frame comes within timeout seconds
+        """
+        try:
+            snapshot = self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        while True:
+            try:
+                snapshot = self.frames.get_nowait()
+            except queue.Empty:
+                return snapshot
+
+    def stop(self):
+        """Stop after the current step"""
+        self._halt.set()
@@ -0,0 +1,264 @@
+"""Parameter sweep (sensitivity analysis) for the contagion model.
+
+Starting from a base configuration file, run the simulation for
+every combination of the parameter values given with --vary,
+several replicates each, spread over a pool of worker processes.
+Writes one line per combination with the mean and standard
+deviation of peak symptomatic cases, the day of that peak, and
+total deaths.
+
+Example:
+    python3 sweep.py contagion.ini --vary P_Transmit=0.2:0.4:0.05 \\
+        --vary Typical.P_Visit=0.25,0.5 --replicates 10 --output sweep.csv
+
+A parameter given without a section replaces it wherever it is set
+(e.g., P_Visit for every kind of individual).  Values are either a
+comma-separated list or an inclusive range start:stop:step.
+
+With --curves FILE, also write the mean, standard deviation and
+quantiles of the count in each state on each day, over the
+replicates of each combination (see ensemble.py).
+"""
+
+import contagion
+import contagion_stats
+import ensemble
+import config
+import model
+
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import math
+import os
+import statistics
+import sys
+from typing import List, NamedTuple, Optional, Tuple
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+class Parameter(NamedTuple):
+    """One parameter to vary, and the values it takes"""
+    name: str
+    section: Optional[str]
+    values: List[str]
+
+    @property
+    def label(self) -> str:
+        return f"{self.section}.{self.name}" if self.section else self.name
+
+
+class Outcome(NamedTuple):
+    """What we keep from one simulation run"""
+    peak_symptomatic: int
+    peak_day: int
+    deaths: int
+
+
+def parse_vary(spec: str) -> Parameter:
+    """Parse [Section.]Parameter=v1,v2,... or [Section.]Parameter=start:stop:step"""
+    name, _, values = spec.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"Expected name=values, got '{spec}'")
+    section, _, name = name.strip().rpartition(".")
+    if ":" in values:
+        start, stop, step = values.split(":")
+        values = _range(start, stop, step)
+    else:
+        values = [v.strip() for v in values.split(",")]
+    return Parameter(name, section or None, values)
+
+
+def check(conf: str, parameters: List[Parameter]):
+    """ValueError unless conf sets every parameter to vary"""
+    config.configure(conf)
+    for parameter in parameters:
+        config.override(parameter.name, parameter.values[0], parameter.section)
+
+
+def _range(start: str, stop: str, step: str) -> List[str]:
+    """Inclusive range, as strings; integers stay integers"""
+    if all(part.strip().lstrip("-").isdigit() for part in (start, stop, step)):
+        return [str(v) for v in range(int(start), int(stop) + 1, int(step))]
+    start, stop, step = float(start), float(stop), float(step)
+    count = int(round((stop - start) / step)) + 1
+    return [f"{start + i * step:g}" for i in range(count)]
+
+
+def run_once(conf: str, engine: str,
+             settings: Tuple[Tuple[Parameter, str], ...],
+             seed: model.Seed = None, series: bool = False):
+    """One headless simulation with some parameters replaced.
+    Runs in a worker process, so it configures from scratch.
+    With series, returns the counts of each day too (see
+    ensemble.Tracker).
+    """
+    config.configure(conf)
+    for parameter, value in settings:
+        config.override(parameter.name, value, parameter.section)
+    population = contagion.ENGINES[engine](config.get_int("Grid", "Rows"),
+                                           config.get_int("Grid", "Cols"),
+                                           seed=seed)
+    tracker = ensemble.Tracker(population) if series else None
+    with open(os.devnull, "w") as quiet:
+        stats = contagion_stats.Stats(population, chart=False, out=quiet)
+        contagion.run_headless(population, stats)
+    outcome = Outcome(stats.max_symptomatic, stats.max_symptomatic_day,
+                      population.count_in_state(model.Health.dead))
+    if series:
+        return outcome, tracker.series()
+    return outcome
+
+
+def run_batch(conf: str, engine: str,
+              settings: Tuple[Tuple[Parameter, str], ...],
+              seeds: List[model.Seed]) -> Tuple[List[Outcome], ensemble.Ensemble]:
+    """Replicates of one combination, their daily counts summed up
+    in an Ensemble, so a worker process sends back just that
+    """
+    outcomes, curves = [], None
+    for seed in seeds:
+        outcome, series = run_once(conf, engine, settings, seed, series=True)
+        if curves is None:
+            curves = ensemble.Ensemble(size=int(series[0].sum()))
+        curves.add_run(series)
+        outcomes.append(outcome)
+    return outcomes, curves
+
+
+def sweep(conf: str, parameters: List[Parameter], replicates: int,
+          engine: str = "array", workers: Optional[int] = None,
+          seed: model.Seed = None
+          ) -> List[Tuple[Tuple[str, ...], List[Outcome]]]:
+    """Run every combination of parameter values, replicates times
+    each, on a pool of worker processes.  Returns the outcomes for
+    each combination of values, in the order of the combinations.
+    Each run gets its own random stream derived from seed, so the
+    same seed gives the same results however the runs are divided
+    among workers.
+    """
+    points = list(itertools.product(*[p.values for p in parameters]))
+    tasks = [tuple(zip(parameters, point))
+             for point in points for _ in range(replicates)]
+    root = model.seed_sequence(seed)
+    log.info(f"{len(points)} combinations x {replicates} replicates, "
+             f"seed {root.entropy}")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(run_once,
+                                 itertools.repeat(conf), itertools.repeat(engine),
+                                 tasks, model.streams(root, len(tasks)),
+                                 chunksize=max(1, replicates // 2)))
+    return [(point, outcomes[i * replicates:(i + 1) * replicates])
+            for i, point in enumerate(points)]
+
+
+def sweep_curves(conf: str, parameters: List[Parameter], replicates: int,
+                 engine: str = "array", workers: Optional[int] = None,
+                 seed: model.Seed = None
+                 ) -> List[Tuple[Tuple[str, ...], List[Outcome], ensemble.Ensemble]]:
+    """Like sweep, with the same runs from the same seed, but also
+    the statistics of each combination's daily counts.  Each
+    combination's replicates are split into a batch per worker,
+    and the batches' ensembles merged.
+    """
+    points = list(itertools.product(*[p.values for p in parameters]))
+    root = model.seed_sequence(seed)
+    seeds = model.streams(root, len(points) * replicates)
+    batch = max(1, math.ceil(replicates / (workers or os.cpu_count() or 1)))
+    tasks = []
+    for i, point in enumerate(points):
+        for first in range(0, replicates, batch):
+            last = min(first + batch, replicates)
+            tasks.append((i, tuple(zip(parameters, point)),
+                          seeds[i * replicates + first:i * replicates + last]))
+    log.info(f"{len(points)} combinations x {replicates} replicates, "
+             f"seed {root.entropy}, {len(tasks)} batches")
+    results = [(point, [], None) for point in points]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        batches = pool.map(run_batch,
+                           itertools.repeat(conf), itertools.repeat(engine),
+                           [settings for _, settings, _ in tasks],
+                           [batch_seeds for _, _, batch_seeds in tasks])
+        # Batches come back in order, so outcomes stay in replicate order
+        for (i, _, _), (outcomes, curves) in zip(tasks, batches):
+            point, so_far, merged = results[i]
+            if merged is None:
+                merged = curves
+            else:
+                merged.merge(curves)
+            results[i] = (point, so_far + outcomes, merged)
+    return results
+
+
+def write_curves(out, parameters: List[Parameter],
+                 results: List[Tuple[Tuple[str, ...], List[Outcome], ensemble.Ensemble]]):
+    """Daily statistics of each combination, after its parameter values"""
+    labels = [p.label for p in parameters]
+    for i, (point, _, curves) in enumerate(results):
+        curves.write_csv(out, prefix=point, labels=labels, header=(i == 0))
+
+
+def write_table(out, parameters: List[Parameter],
+                results: List[Tuple[Tuple[str, ...], List[Outcome]]]):
+    """Mean and standard deviation of each outcome, one row per combination"""
+    writer = csv.writer(out)
+    header = [p.label for p in parameters] + ["replicates"]
+    for field in Outcome._fields:
+        header += [f"{field}_mean", f"{field}_sd"]
+    writer.writerow(header)
+    for point, outcomes in results:
+        row = list(point) + [len(outcomes)]
+        for field in Outcome._fields:
+            values = [getattr(outcome, field) for outcome in outcomes]
+            row.append(f"{statistics.mean(values):.2f}")
+            row.append(f"{statistics.stdev(values):.2f}" if len(values) > 1 else "")
+        writer.writerow(row)
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser(
+        description="Sensitivity analysis: run contagion over a grid of parameters")
+    parser.add_argument("conf", help="Base configuration file")
+    parser.add_argument("--vary", type=parse_vary, action="append", default=[],
+                        metavar="[SECTION.]PARAM=VALUES",
+                        help="v1,v2,... or start:stop:step (repeatable)")
+    parser.add_argument("--replicates", type=int, default=5)
+    parser.add_argument("--engine", choices=sorted(contagion.ENGINES),
+                        default="array")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Root random seed, to repeat a sweep exactly")
+    parser.add_argument("--output", type=argparse.FileType("w"),
+                        default=sys.stdout)
+    parser.add_argument("--curves", type=argparse.FileType("w"), metavar="FILE",
+                        help="Also write daily mean, sd and quantiles of each "
+                             "state's count to FILE")
+    args = parser.parse_args()
+    try:
+        check(args.conf, args.vary)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main():
+    args = cli()
+    if args.curves:
+        results = sweep_curves(args.conf, args.vary, args.replicates,
+                               engine=args.engine, workers=args.workers, seed=args.seed)
+        write_curves(args.curves, args.vary, results)
+        results = [(point, outcomes) for point, outcomes, _ in results]
+    else:
+        results = sweep(args.conf, args.vary, args.replicates,
+                        engine=args.engine, workers=args.workers, seed=args.seed)
+    write_table(args.output, args.vary, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Tests for the headless driver in contagion.py.
+"""
+import contextlib
+import io
+import os
+import unittest
+
+import config
+import model
+import array_model
+import contagion
+import contagion_stats
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestRunHeadless(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+
+    def run_to_end(self, pop) -> list:
+        """Whether anyone was contagious after each day, and the report lines"""
+        contagious = []
+
+        class Ear:
+            def notify(self, subject, event):
+                if event == "timestep":
+                    contagious.append(not contagion.quiescent(subject))
+
+        pop.add_listener(Ear())
+        out = io.StringIO()
+        contagion.run_headless(pop, contagion_stats.Stats(pop, chart=False, out=out))
+        return contagious, out.getvalue().splitlines()
+
+    def test_stops_the_day_nobody_is_contagious(self):
+        for seed in range(5):
+            for engine in (model.Population, array_model.ArrayPopulation):
+                pop = engine(12, 12, seed=seed)
+                contagious, lines = self.run_to_end(pop)
+                self.assertTrue(contagion.quiescent(pop))
+                # Every day but the last still had someone contagious
+                self.assertEqual(contagious, [True] * (pop.day - 1) + [False])
+                # A report every epoch, and one for the last partial epoch
+                days = [int(line.split()[1]) for line in lines if line.startswith("Day")]
+                expected = list(range(contagion.EPOCH, pop.day + 1, contagion.EPOCH))
+                if pop.day % contagion.EPOCH:
+                    expected.append(pop.day)
+                self.assertEqual(days, expected)
+
+
+class TestRunId(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+
+    def test_conf_engine_and_seed(self):
+        self.assertEqual(contagion.run_id("tiny.ini", array_model.ArrayPopulation(6, 6, seed=4)),
+                         "tiny.ini:array:4")
+        self.assertEqual(contagion.run_id(os.path.join(HERE, "tiny.ini"),
+                                          model.Population(6, 6, seed=4)),
+                         "tiny.ini:object:4")
+        self.assertEqual(contagion.run_id("other.ini",
+                                          model.Population(6, 6, seed=4, block_random=True)),
+                         "other.ini:object+block-random:4")
+
+
+class TestCli(unittest.TestCase):
+
+    def rejects(self, *argv):
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            contagion.cli(list(argv))
+
+    def test_checkpoint(self):
+        args = contagion.cli(["--headless", "--engine", "array", "--checkpoint", "run.ckpt"])
+        self.assertEqual(args.checkpoint, "run.ckpt")
+        self.rejects("--engine", "array", "--checkpoint", "run.ckpt")
+
+    def test_checkpoint_needs_an_engine_that_saves(self):
+        self.rejects("--headless", "--engine", "event", "--checkpoint", "run.ckpt")
+        self.rejects("--headless", "--engine", "mapped", "--checkpoint", "run.ckpt")
+
+    def test_network_not_checkpointed(self):
+        self.rejects("--headless", "--network", "edges.txt", "--checkpoint", "run.ckpt")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+Tests for ensemble.py.
+"""
+import io
+import os
+import pickle
+import unittest
+
+import numpy as np
+
+import config
+import array_model
+import contagion
+import contagion_stats
+import ensemble
+import model
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def random_runs(count: int, size: int, seed: int = 0) -> list:
+    """Made-up runs of different lengths"""
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, size + 1, (rng.integers(1, 40), len(model.Health)))
+            for _ in range(count)]
+
+
+def skewed_runs(count: int, size: int, seed: int = 0) -> list:
+    """Made-up runs whose counts are mostly small, as real runs'
+    symptomatic and dead are, with a few big ones
+    """
+    rng = np.random.default_rng(seed)
+    return [np.minimum(rng.lognormal(2.0, 1.5, (rng.integers(1, 40), len(model.Health))),
+                       size).astype(np.int64)
+            for _ in range(count)]
+
+
+def padded(runs: list) -> np.ndarray:
+    """runs x days x states, each run carried on as it ended"""
+    days = max(len(run) for run in runs)
+    return np.stack([np.concatenate([run, np.repeat(run[-1:], days - len(run), axis=0)])
+                     for run in runs])
+
+
+class TestEnsemble(unittest.TestCase):
+
+    def test_moments_over_all_runs(self):
+        runs = random_runs(100, 1000)
+        curves = ensemble.Ensemble(1000)
+        for run in runs:
+            curves.add_run(run)
+        everything = padded(runs)
+        summary = curves.summary()
+        self.assertEqual(curves.runs, 100)
+        self.assertEqual(curves.days, everything.shape[1])
+        np.testing.assert_allclose(summary["mean"], everything.mean(axis=0))
+        np.testing.assert_allclose(summary["sd"], everything.std(axis=0, ddof=1))
+
+    def quantiles_match(self, runs: list, size: int, accuracy: float = ensemble.ACCURACY):
+        """Quantiles within accuracy of their value, and exact for
+        counts that get a bin each
+        """
+        curves = ensemble.Ensemble(size, accuracy=accuracy)
+        for run in runs:
+            curves.add_run(run)
+        summary = curves.summary()
+        for q in ensemble.QUANTILES:
+            exact = np.quantile(padded(runs), q, axis=0, method="inverted_cdf")
+            np.testing.assert_array_less(np.abs(summary[q] - exact),
+                                         accuracy * exact + 1e-9)
+            small = exact < curves.linear
+            np.testing.assert_array_equal(summary[q][small], exact[small])
+        return curves
+
+    def test_quantiles_within_accuracy(self):
+        self.quantiles_match(random_runs(100, 1000), 1000)
+        self.quantiles_match(random_runs(100, 1000), 1000, accuracy=0.05)
+
+    def test_small_counts_in_a_big_population(self):
+        runs = skewed_runs(100, 10_000)
+        self.assertLess(np.median(padded(runs)), 20)
+        self.assertGreater(padded(runs).max(), 1000)
+        curves = self.quantiles_match(runs, 10_000)
+        self.assertLess(curves.bins, 400)
+
+    def test_small_populations_get_exact_quantiles(self):
+        runs = random_runs(30, 20)
+        curves = self.quantiles_match(runs, 20)
+        self.assertGreater(curves.linear, 20)
+
+    def test_merge(self):
+        runs = random_runs(60, 500)
+        whole = ensemble.Ensemble(500)
+        parts = [ensemble.Ensemble(500) for _ in range(3)]
+        for i, run in enumerate(runs):
+            whole.add_run(run)
+            parts[i % 3].add_run(run)
+        merged = parts[0]
+        for part in parts[1:]:
+            merged.merge(pickle.loads(pickle.dumps(part)))
+        self.assertEqual(merged.runs, 60)
+        expected, got = whole.summary(), merged.summary()
+        for key in expected:
+            np.testing.assert_allclose(got[key], expected[key])
+        with self.assertRaises(ValueError):
+            merged.merge(ensemble.Ensemble(400))
+        with self.assertRaises(ValueError):
+            merged.merge(ensemble.Ensemble(500, accuracy=0.05))
+
+    def test_tracked_runs(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+        curves = ensemble.Ensemble(144)
+        finals = []
+        for seed in range(5):
+            pop = array_model.ArrayPopulation(12, 12, seed=seed)
+            tracker = ensemble.Tracker(pop)
+            contagion.run_headless(pop, contagion_stats.Stats(pop, chart=False,
+                                                              out=io.StringIO()))
+            series = tracker.series()
+            self.assertEqual(len(series), pop.day)
+            self.assertEqual(series[-1].tolist(), [pop.counts()[s] for s in model.Health])
+            curves.add_run(series)
+            finals.append(series[-1])
+        # By the last day every run has ended
+        np.testing.assert_allclose(curves.summary()["mean"][-1], np.mean(finals, axis=0))
+        out = io.StringIO()
+        curves.write_csv(out, prefix=["x"], labels=["label"])
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + curves.days * len(model.Health))
+        self.assertTrue(lines[0].startswith("label,day,state,runs,mean,sd,q05,"))
+        self.assertTrue(lines[1].startswith("x,1,vulnerable,5,"))
+
+
+if __name__ == "__main__":
+    unittest.main()
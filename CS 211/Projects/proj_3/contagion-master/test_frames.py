@@ -0,0 +1,62 @@
+"""
+Tests for frames.py.
+"""
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+import config
+import array_model
+import frames
+import palette
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_png(data: bytes) -> np.ndarray:
+    """Just enough of a PNG reader for the files we write"""
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, chunks = 8, {}
+    while pos < len(data):
+        length, = struct.unpack(">I", data[pos:pos + 4])
+        kind, body = data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]
+        crc, = struct.unpack(">I", data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(kind + body)
+        chunks[kind] = body
+        pos += 12 + length
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    rows = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8)
+    rows = rows.reshape(height, 1 + 3 * width)
+    assert not rows[:, 0].any()
+    return rows[:, 1:].reshape(height, width, 3)
+
+
+class TestFrames(unittest.TestCase):
+
+    def test_png_round_trip(self):
+        pixels = np.random.default_rng(1).integers(0, 256, (5, 7, 3), dtype=np.uint8)
+        np.testing.assert_array_equal(read_png(frames.png(pixels)), pixels)
+
+    def test_frame_every_few_days(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+        pop = array_model.ArrayPopulation(12, 12, seed=4)
+        with tempfile.TemporaryDirectory() as directory:
+            frames.FrameWriter(pop, directory, every=5, width=24, height=24)
+            pop.seed()
+            for _ in range(10):
+                pop.step()
+            day_10 = palette.rasterize(pop.state_grid(), 24, 24)
+            for _ in range(2):
+                pop.step()
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ["frame_00005.png", "frame_00010.png"])
+            with open(os.path.join(directory, "frame_00010.png"), "rb") as f:
+                np.testing.assert_array_equal(read_png(f.read()), day_10)
+
+
+if __name__ == "__main__":
+    unittest.main()
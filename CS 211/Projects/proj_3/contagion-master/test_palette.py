@@ -0,0 +1,59 @@
+"""
+Tests for palette.py.
+"""
+import os
+import unittest
+
+import numpy as np
+
+import config
+import model
+import array_model
+import palette
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestRasterize(unittest.TestCase):
+
+    def setUp(self):
+        self.states = np.array([[1, 2, 3],
+                                [4, 5, 1]], dtype=np.int8)
+
+    def test_cells_bigger_than_pixels(self):
+        pixels = palette.rasterize(self.states, 6, 4)
+        self.assertEqual(pixels.shape, (4, 6, 3))
+        for row in range(4):
+            for col in range(6):
+                state = model.Health(int(self.states[row // 2, col // 2]))
+                self.assertEqual(tuple(pixels[row, col]), palette.STATE_RGB[state])
+
+    def test_cells_smaller_than_pixels(self):
+        states = np.repeat(np.repeat(self.states, 10, axis=0), 10, axis=1)
+        np.testing.assert_array_equal(palette.rasterize(states, 3, 2),
+                                      palette.rasterize(self.states, 3, 2))
+
+    def test_ppm(self):
+        image = palette.ppm(palette.rasterize(self.states, 3, 2))
+        self.assertTrue(image.startswith(b"P6 3 2 255\n"))
+        self.assertEqual(len(image), len(b"P6 3 2 255\n") + 3 * 2 * 3)
+
+
+class TestStateGrid(unittest.TestCase):
+
+    def test_matches_cells(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+        for engine in (model.Population, array_model.ArrayPopulation):
+            pop = engine(12, 12, seed=2)
+            pop.seed()
+            for _ in range(20):
+                pop.step()
+            grid = pop.state_grid()
+            self.assertEqual(grid.shape, (12, 12))
+            for row in range(12):
+                for col in range(12):
+                    self.assertEqual(grid[row, col], pop.state_at(row, col).value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,559 @@
+"""
+Tests for the population models (model.py and array_model.py).
+
+Note that the unittest module predates PEP-8 guidelines, which
+is why we have a bunch of names that don't comply with the
+standard.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import config
+import model
+import array_model
+import parallel_model
+import event_model
+import mapped_model
+import network_model
+import adjacency
+import contagion
+import statistics
+import checkpoint
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def configure(ini: str):
+    config.configure(os.path.join(HERE, ini))
+
+
+def scan(pop) -> dict:
+    """Count states the slow way, by looking at every cell"""
+    counts = {state: 0 for state in model.Health}
+    for row in pop.cells:
+        for cell in row:
+            counts[cell.state] += 1
+    return counts
+
+
+def history(pop, days: int) -> list:
+    pop.seed()
+    return history_from(pop, days)
+
+
+def history_from(pop, days: int) -> list:
+    """Like history, but carry on without seeding"""
+    counts = []
+    for _ in range(days):
+        pop.step()
+        counts.append(pop.counts())
+    return counts
+
+
+def change_sets_match_cells(test: unittest.TestCase, pop):
+    """The population's change-set events report exactly the
+    cells that notify their own listeners of a change
+    """
+    heard, batched = [], []
+
+    class Ear:
+        def notify(self, subject, event):
+            heard.append(subject.row * pop.ncols + subject.col)
+
+    class BatchEar:
+        def notify(self, subject, event):
+            if event == "changes":
+                batched.extend(int(i) for i in subject.last_changes)
+
+    for row in pop.cells:
+        for cell in row:
+            cell.add_listener(Ear())
+    pop.add_listener(BatchEar())
+    pop.seed()
+    test.assertEqual(len(batched), 1)
+    for _ in range(40):
+        pop.step()
+        test.assertEqual(sorted(batched), sorted(heard))
+    for i in batched:
+        test.assertIsInstance(pop.state_at(*divmod(i, pop.ncols)), model.Health)
+
+
+class TestSeeds(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+
+    def test_same_seed_same_run(self):
+        for engine in (model.Population, array_model.ArrayPopulation):
+            first = history(engine(12, 12, seed=42), 60)
+            again = history(engine(12, 12, seed=42), 60)
+            self.assertEqual(first, again)
+
+    def test_streams_are_repeatable(self):
+        one = [s.generate_state(2).tolist() for s in model.streams(7, 3)]
+        two = [s.generate_state(2).tolist() for s in model.streams(7, 3)]
+        self.assertEqual(one, two)
+        self.assertEqual(len({tuple(s) for s in one}), 3)
+
+
+class TestPopulation(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+        self.pop = model.Population(12, 12)
+
+    def test_individuals_get_their_neighbors(self):
+        for row in range(12):
+            for col in range(12):
+                neighbors = self.pop.cells[row][col].neighbors
+                self.assertEqual(neighbors, self.pop.neighbors(row, col))
+                self.assertEqual(len(neighbors), len(set(neighbors)))
+                self.assertNotIn((row, col), neighbors)
+                # tiny.ini: 2 neighbors at distance 1, even in corners
+                self.assertEqual(len(neighbors), 2)
+                for n_row, n_col in neighbors:
+                    self.assertLessEqual(abs(n_row - row), 1)
+                    self.assertLessEqual(abs(n_col - col), 1)
+
+    def test_change_sets(self):
+        change_sets_match_cells(self, self.pop)
+
+    def test_individuals_are_compact(self):
+        shared = {}
+        for row in self.pop.cells:
+            for cell in row:
+                self.assertFalse(hasattr(cell, "__dict__"))
+                self.assertIs(shared.setdefault(cell.kind, cell.params), cell.params)
+        self.assertEqual(len(shared), 2)
+
+    def test_counts_follow_every_step(self):
+        self.pop.seed()
+        self.assertEqual(self.pop.counts(), scan(self.pop))
+        for _ in range(40):
+            self.pop.step()
+            self.assertEqual(self.pop.counts(), scan(self.pop))
+
+
+class TestBlockRandom(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+        self.pop = model.Population(12, 12, seed=8, block_random=True)
+
+    def test_counts_follow_every_step(self):
+        self.pop.seed()
+        for _ in range(40):
+            self.pop.step()
+            self.assertEqual(self.pop.counts(), scan(self.pop))
+
+    def test_same_seed_same_run(self):
+        again = model.Population(12, 12, seed=8, block_random=True)
+        self.assertEqual(history(self.pop, 40), history(again, 40))
+
+    def test_same_epidemics_as_dice_one_at_a_time(self):
+        """Mean outbreak size and length agree with the usual stepping.
+        contagion.ini, where not everyone visits every day.
+        """
+        configure("contagion.ini")
+        outcomes = {}
+        for block_random in (False, True):
+            sizes, days = [], []
+            for seed in range(200):
+                pop = model.Population(8, 8, seed=seed, block_random=block_random)
+                pop.seed()
+                while not contagion.quiescent(pop):
+                    pop.step()
+                sizes.append(pop.count_in_state(model.Health.recovered)
+                             + pop.count_in_state(model.Health.dead))
+                days.append(pop.day)
+            outcomes[block_random] = (sizes, days)
+        for one_at_a_time, blocks in zip(outcomes[False], outcomes[True]):
+            error = statistics.stdev(one_at_a_time) * (2 / len(one_at_a_time)) ** 0.5
+            self.assertLess(abs(statistics.mean(one_at_a_time) - statistics.mean(blocks)),
+                            4 * error)
+
+
+class TestArrayPopulation(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+        self.pop = array_model.ArrayPopulation(12, 12)
+
+    def test_everyone_starts_vulnerable(self):
+        self.assertEqual(self.pop.count_in_state(model.Health.vulnerable), 144)
+
+    def test_seed_infects_one(self):
+        self.pop.seed()
+        self.assertEqual(self.pop.count_in_state(model.Health.asymptomatic), 1)
+
+    def test_neighbors_are_nearby(self):
+        for row in range(12):
+            for col in range(12):
+                neighbors = self.pop.neighbors(row, col)
+                self.assertEqual(len(neighbors), len(set(neighbors)))
+                self.assertNotIn((row, col), neighbors)
+                for n_row, n_col in neighbors:
+                    self.assertLessEqual(abs(n_row - row), 1)
+                    self.assertLessEqual(abs(n_col - col), 1)
+
+    def test_nobody_within_distance_zero(self):
+        num = np.array([3, 3, 8, 8] * 4)
+        dist = np.array([0, 0, 1, 0] * 4)
+        table = adjacency.grid_adjacency(4, 4, num, dist, np.random.default_rng(1))
+        self.assertEqual(table.degree(np.arange(16)).tolist(),
+                         [0, 0, 5, 0, 0, 0, 8, 0, 0, 0, 8, 0, 0, 0, 5, 0])
+
+    def test_run_conserves_population(self):
+        self.pop.seed()
+        for _ in range(1000):
+            self.pop.step()
+        total = sum(self.pop.count_in_state(state) for state in model.Health)
+        self.assertEqual(total, 144)
+        self.assertEqual(self.pop.count_in_state(model.Health.asymptomatic), 0)
+        self.assertEqual(self.pop.count_in_state(model.Health.symptomatic), 0)
+
+    def test_counts_follow_every_step(self):
+        self.pop.seed()
+        for _ in range(40):
+            self.pop.step()
+            self.assertEqual(self.pop.counts(), scan(self.pop))
+
+    def test_change_sets(self):
+        change_sets_match_cells(self, self.pop)
+
+    def test_cells_hear_about_changes(self):
+        heard = []
+
+        class Ear:
+            def notify(self, subject, event):
+                heard.append((subject.row, subject.col, subject.state))
+
+        for row in self.pop.cells:
+            for cell in row:
+                cell.add_listener(Ear())
+        self.pop.seed()
+        self.assertEqual(len(heard), 1)
+        row, col, state = heard[0]
+        self.assertEqual(state, model.Health.asymptomatic)
+        self.assertIs(self.pop.visit((row, col)).state, model.Health.asymptomatic)
+
+
+class TestPartitionedPopulation(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+        self.pop = parallel_model.PartitionedPopulation(12, 12, seed=5, workers=3,
+                                                        block_rows=2)
+
+    def tearDown(self):
+        self.pop.close()
+
+    def test_bands_cover_grid(self):
+        self.assertEqual(self.pop.bands, [(0, 48), (48, 96), (96, 144)])
+
+    def test_bands_are_whole_blocks(self):
+        pop = parallel_model.PartitionedPopulation(12, 12, seed=5, workers=4, block_rows=5)
+        try:
+            self.assertEqual(pop.bands, [(0, 60), (60, 120), (120, 144)])
+        finally:
+            pop.close()
+
+    def test_counts_follow_every_step(self):
+        self.pop.seed()
+        for _ in range(60):
+            self.pop.step()
+            self.assertEqual(self.pop.counts(), scan(self.pop))
+        self.assertEqual(sum(self.pop.counts().values()), 144)
+
+    def test_same_seed_same_run(self):
+        again = parallel_model.PartitionedPopulation(12, 12, seed=5, workers=3,
+                                                     block_rows=2)
+        try:
+            self.assertEqual(history(self.pop, 40), history(again, 40))
+        finally:
+            again.close()
+
+    def test_same_run_however_many_workers(self):
+        expected = history(self.pop, 40)
+        for workers in [1, 2, 6]:
+            pop = parallel_model.PartitionedPopulation(12, 12, seed=5, workers=workers,
+                                                       block_rows=2)
+            try:
+                self.assertEqual(history(pop, 40), expected)
+            finally:
+                pop.close()
+
+
+class TestEventPopulation(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+        self.pop = event_model.EventPopulation(12, 12, seed=9)
+
+    def test_counts_follow_every_step(self):
+        self.pop.seed()
+        for _ in range(60):
+            self.pop.step()
+            self.assertEqual(self.pop.counts(), scan(self.pop))
+        self.assertEqual(sum(self.pop.counts().values()), 144)
+
+    def test_change_sets(self):
+        change_sets_match_cells(self, event_model.EventPopulation(12, 12, seed=9))
+
+    def test_same_seed_same_run(self):
+        again = event_model.EventPopulation(12, 12, seed=9)
+        self.assertEqual(history(self.pop, 60), history(again, 60))
+
+    def test_same_epidemics_as_array_population(self):
+        """Mean outbreak size and length agree with the day-by-day engine"""
+        outcomes = {}
+        for engine in (array_model.ArrayPopulation, event_model.EventPopulation):
+            sizes, days = [], []
+            for seed in range(300):
+                pop = engine(12, 12, seed=seed)
+                pop.seed()
+                while not contagion.quiescent(pop):
+                    pop.step()
+                sizes.append(pop.count_in_state(model.Health.recovered)
+                             + pop.count_in_state(model.Health.dead))
+                days.append(pop.day)
+            outcomes[engine] = (sizes, days)
+        for by_array, by_event in zip(outcomes[array_model.ArrayPopulation],
+                                      outcomes[event_model.EventPopulation]):
+            error = statistics.stdev(by_array) * (2 / len(by_array)) ** 0.5
+            self.assertLess(abs(statistics.mean(by_array) - statistics.mean(by_event)),
+                            4 * error)
+
+
+class TestMappedPopulation(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+        self.dir = tempfile.TemporaryDirectory()
+        # Chunks of 5 rows, so steps cross chunk boundaries
+        self.pop = mapped_model.MappedPopulation(12, 12, seed=6, directory=self.dir.name,
+                                                 chunk_rows=5)
+
+    def tearDown(self):
+        self.pop.close()
+        self.dir.cleanup()
+
+    def test_chunks_cover_grid(self):
+        self.assertEqual(list(self.pop.chunks()), [(0, 60), (60, 120), (120, 144)])
+
+    def test_neighbors_are_nearby(self):
+        for row in range(12):
+            for col in range(12):
+                dist = self.pop.Visit_Dist[self.pop.kind[row * 12 + col]]
+                for r, c in self.pop.neighbors(row, col):
+                    self.assertLessEqual(max(abs(r - row), abs(c - col)), dist)
+
+    def test_counts_follow_every_step(self):
+        self.pop.seed()
+        for _ in range(60):
+            self.pop.step()
+            self.assertEqual(self.pop.counts(), scan(self.pop))
+        self.assertEqual(sum(self.pop.counts().values()), 144)
+
+    def test_change_sets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pop = mapped_model.MappedPopulation(12, 12, seed=6, directory=directory,
+                                                chunk_rows=5)
+            change_sets_match_cells(self, pop)
+            pop.close()
+
+    def test_same_seed_same_run(self):
+        again = mapped_model.MappedPopulation(12, 12, seed=6, chunk_rows=5)
+        try:
+            self.assertEqual(history(self.pop, 40), history(again, 40))
+        finally:
+            again.close()
+
+    def test_others_can_look(self):
+        self.pop.seed()
+        for _ in range(10):
+            self.pop.step()
+        info, states = mapped_model.peek(self.dir.name)
+        self.assertEqual(info["day"], 10)
+        self.assertEqual(info["counts"],
+                         {state.name: n for state, n in self.pop.counts().items()})
+        self.pop.step()
+        self.assertEqual(states.tolist(), self.pop.state.reshape(12, 12).tolist())
+
+    def test_reopen(self):
+        """A closed run carries on as one that never stopped"""
+        straight = mapped_model.MappedPopulation(12, 12, seed=6, chunk_rows=5)
+        try:
+            expected = history(straight, 45)[15:]
+            neighbors = straight.neighbors(3, 4)
+        finally:
+            straight.close()
+        history(self.pop, 15)
+        self.pop.close()
+        self.pop = mapped_model.MappedPopulation.reopen(self.dir.name, chunk_rows=5)
+        self.assertEqual(self.pop.day, 15)
+        self.assertEqual(self.pop.counts(), scan(self.pop))
+        self.assertEqual(self.pop.neighbors(3, 4), neighbors)
+        self.assertEqual(history_from(self.pop, 30), expected)
+
+    def test_temporary_directory_removed(self):
+        pop = mapped_model.MappedPopulation(12, 12, seed=6)
+        directory = pop.directory
+        self.assertTrue(os.path.exists(os.path.join(directory, "state.npy")))
+        pop.close()
+        self.assertFalse(os.path.exists(directory))
+
+
+class TestNetworkPopulation(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "edges.txt")
+        # A ring of 30 with sparse ids, some edges twice, a self loop
+        ids = [100 + 7 * i for i in range(30)]
+        with open(self.path, "w") as f:
+            f.write("# ring\n")
+            for i in range(30):
+                f.write(f"{ids[i]}\t{ids[(i + 1) % 30]}\n")
+            f.write(f"{ids[1]} {ids[0]}\n{ids[5]} {ids[5]}\n")
+        self.pop = network_model.NetworkPopulation.from_file(self.path, seed=2)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_from_edges(self):
+        table = adjacency.from_edges([0, 2, 2, 1, 3], [1, 0, 0, 1, 2], 4)
+        self.assertEqual([table.of(i).tolist() for i in range(4)],
+                         [[1, 2], [0], [0, 3], [2]])
+        table = adjacency.from_edges([0, 2], [1, 0], 3, directed=True)
+        self.assertEqual([table.of(i).tolist() for i in range(3)], [[1], [], [0]])
+
+    def test_contacts_are_neighbors(self):
+        self.assertEqual((self.pop.nrows, self.pop.ncols), (5, 6))
+        self.assertEqual(self.pop.node_ids.tolist(), [100 + 7 * i for i in range(30)])
+        for node in range(30):
+            self.assertEqual(self.pop.contacts(node), sorted([(node - 1) % 30, (node + 1) % 30]))
+            row, col = divmod(node, 6)
+            self.assertEqual(self.pop.cells[row][col].neighbors,
+                             [divmod(j, 6) for j in self.pop.contacts(node)])
+
+    def test_counts_follow_every_step(self):
+        self.pop.seed()
+        for _ in range(60):
+            self.pop.step()
+            self.assertEqual(self.pop.counts(), scan(self.pop))
+        self.assertEqual(sum(self.pop.counts().values()), 30)
+
+    def test_spreads_only_along_contacts(self):
+        """On a ring, the infected are always one unbroken arc"""
+        self.pop.seed()
+        for _ in range(60):
+            self.pop.step()
+            touched = [cell.state != model.Health.vulnerable
+                       for row in self.pop.cells for cell in row]
+            runs = sum(touched[i] and not touched[i - 1] for i in range(30))
+            self.assertLessEqual(runs, 1)
+
+    def test_same_seed_same_run(self):
+        again = network_model.NetworkPopulation.from_file(self.path, seed=2)
+        self.assertEqual(history(self.pop, 40), history(again, 40))
+
+    def test_layout(self):
+        self.assertEqual(network_model.layout(30), (5, 6))
+        self.assertEqual(network_model.layout(13), (4, 4))
+        self.assertEqual(network_model.layout(200_003), (447, 448))
+        pop = network_model.NetworkPopulation(self.pop.adjacency, ncols=7)
+        self.assertEqual((pop.nrows, pop.ncols), (5, 7))
+        with self.assertRaises(ValueError):
+            network_model.NetworkPopulation(self.pop.adjacency, ncols=0)
+
+    def test_short_last_row(self):
+        # A ring of 13, laid out 4 x 4 with 3 cells empty
+        table = adjacency.from_edges(np.arange(13), (np.arange(13) + 1) % 13, 13)
+        for seed in range(10):
+            pop = network_model.NetworkPopulation(table, seed=seed)
+            self.assertEqual([len(row) for row in pop.cells], [4, 4, 4, 1])
+            states = pop.state_grid()
+            self.assertEqual(states.shape, (4, 4))
+            self.assertEqual(states[3, 1:].tolist(), [model.EMPTY] * 3)
+            pop.seed()
+            self.assertEqual(pop.count_in_state(model.Health.asymptomatic), 1)
+            for _ in range(30):
+                pop.step()
+                self.assertEqual(pop.counts(), scan(pop))
+            self.assertEqual(sum(pop.counts().values()), 13)
+            self.assertEqual(np.count_nonzero(pop.state_grid() == model.EMPTY), 3)
+
+    def test_no_edges(self):
+        with open(self.path, "w") as f:
+            f.write("# nothing here\n")
+        with self.assertRaises(ValueError):
+            network_model.NetworkPopulation.from_file(self.path)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        configure("tiny.ini")
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "run.ckpt")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def resume_matches(self, pop, resume=checkpoint.load):
+        """Resumed run carries on exactly as the original does"""
+        pop.seed()
+        for _ in range(15):
+            pop.step()
+        checkpoint.save(pop, self.path, epoch=1)
+        resumed, meta = resume(self.path)
+        self.assertEqual(meta, {"epoch": 1})
+        self.assertIs(type(resumed), type(pop))
+        self.assertEqual(resumed.day, 15)
+        self.assertEqual(resumed.counts(), pop.counts())
+        self.assertEqual(resumed.counts(), scan(resumed))
+        self.assertEqual(resumed.neighbors(3, 4), pop.neighbors(3, 4))
+        try:
+            self.assertEqual(history_from(resumed, 30), history_from(pop, 30))
+        finally:
+            if hasattr(resumed, "close"):
+                resumed.close()
+
+    def test_object_population(self):
+        self.resume_matches(model.Population(12, 12, seed=3))
+
+    def test_object_population_block_random(self):
+        self.resume_matches(model.Population(12, 12, seed=3, block_random=True))
+
+    def test_array_population(self):
+        self.resume_matches(array_model.ArrayPopulation(12, 12, seed=3))
+
+    def test_array_population_without_mmap(self):
+        self.resume_matches(array_model.ArrayPopulation(12, 12, seed=3),
+                            resume=lambda path: checkpoint.load(path, mmap=False))
+
+    def test_partitioned_population(self):
+        pop = parallel_model.PartitionedPopulation(12, 12, seed=3, workers=2, block_rows=4)
+        try:
+            self.resume_matches(pop)
+        finally:
+            pop.close()
+
+    def test_event_population_not_supported(self):
+        with self.assertRaises(ValueError):
+            checkpoint.save(event_model.EventPopulation(12, 12), self.path)
+
+    def test_not_a_checkpoint(self):
+        with open(self.path, "wb") as f:
+            f.write(b"Day 1")
+        with self.assertRaises(ValueError):
+            checkpoint.load(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests for profiling.py.
+"""
+import io
+import os
+import unittest
+
+import config
+import array_model
+import mapped_model
+import profiling
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestProfiling(unittest.TestCase):
+
+    def tearDown(self):
+        profiling.disable()
+        profiling.PHASES.clear()
+
+    def test_disabled_does_nothing(self):
+        profiling.disable()
+        self.assertIs(profiling.phase("step"), profiling.phase("other"))
+        with profiling.phase("step"):
+            pass
+        self.assertEqual(profiling.PHASES, {})
+
+    def test_histogram(self):
+        phase = profiling.Phase("step")
+        for ns in [3] * 98 + [1000, 5000]:
+            phase.add(ns)
+        self.assertEqual(phase.count, 100)
+        self.assertEqual(phase.total, 3 * 98 + 6000)
+        self.assertEqual(phase.longest, 5000)
+        self.assertEqual(sum(phase.buckets), 100)
+        self.assertEqual(phase.buckets[2], 98)      # 2 <= 3 < 4
+        self.assertEqual(phase.quantile(0.5), 4)
+        self.assertEqual(phase.quantile(0.99), 1024)
+        self.assertEqual(phase.quantile(1.0), 5000)
+
+    def test_steps_broken_down(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+        profiling.enable()
+        with profiling.phase("build"):
+            pop = array_model.ArrayPopulation(12, 12, seed=1)
+        pop.seed()
+        for _ in range(20):
+            with profiling.phase("step"):
+                pop.step()
+        phases = profiling.PHASES
+        self.assertEqual(list(phases), ["build", "build.neighbors", "step",
+                                        "step.decide", "step.commit", "step.notify"])
+        for name in ["step.decide", "step.commit", "step.notify"]:
+            self.assertEqual(phases[name].count, 20)
+        parts = sum(phases[name].total for name in ["step.decide", "step.commit", "step.notify"])
+        self.assertLessEqual(parts, phases["step"].total)
+        out = io.StringIO()
+        profiling.report(out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2 + len(phases))
+        self.assertTrue(lines[4].startswith("step "))
+        self.assertTrue(lines[5].startswith("  decide "))
+
+    def test_one_of_each_phase_a_step(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+        pop = mapped_model.MappedPopulation(12, 12, seed=1, chunk_rows=5)
+        pop.seed()
+        profiling.enable()
+        for _ in range(20):
+            pop.step()
+        pop.close()
+        for name in ["step.decide", "step.commit", "step.notify", "step.save"]:
+            self.assertEqual(profiling.PHASES[name].count, 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
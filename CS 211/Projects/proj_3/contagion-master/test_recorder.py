@@ -0,0 +1,56 @@
+"""
+Tests for recorder.py.
+"""
+import csv
+import os
+import tempfile
+import unittest
+
+import config
+import model
+import array_model
+import recorder
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestRecorder(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "days.csv")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def read(self) -> list:
+        with open(self.path, newline="") as f:
+            return list(csv.DictReader(f))
+
+    def test_row_per_day(self):
+        for engine in (model.Population, array_model.ArrayPopulation):
+            pop = engine(12, 12, seed=8)
+            record = recorder.Recorder(pop, self.path, run=engine.__name__, buffer=7)
+            pop.seed()
+            expected = []
+            for _ in range(30):
+                pop.step()
+                expected.append(pop.counts())
+                # Buffered rows are written a batch at a time
+                self.assertLess(len(record._rows), 7)
+            record.close()
+            rows = [row for row in self.read() if row["run"] == engine.__name__]
+            self.assertEqual([int(row["day"]) for row in rows], list(range(1, 31)))
+            for row, counts in zip(rows, expected):
+                for state in model.Health:
+                    self.assertEqual(int(row[state.name]), counts[state])
+                    by_kind = sum(int(row[f"{kind}.{state.name}"])
+                                  for kind in array_model.KINDS)
+                    self.assertEqual(by_kind, counts[state])
+        # Second run appended, without a second header
+        self.assertEqual(len(self.read()), 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
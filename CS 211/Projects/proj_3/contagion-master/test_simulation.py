@@ -0,0 +1,88 @@
+"""
+Tests for simulation.py, the simulation thread behind the display.
+"""
+import io
+import os
+import time
+import unittest
+
+import numpy as np
+
+import config
+import array_model
+import contagion
+import contagion_stats
+import simulation
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestSimulation(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(os.path.join(HERE, "tiny.ini"))
+
+    def start(self, seed: int) -> simulation.Simulation:
+        pop = array_model.ArrayPopulation(12, 12, seed=seed)
+        pop.seed()
+        stats = contagion_stats.Stats(pop, chart=False, out=io.StringIO())
+        sim = simulation.Simulation(pop, stats, contagion.quiescent, epoch=contagion.EPOCH)
+        sim.start()
+        return sim
+
+    def test_slow_display_sees_every_epoch_and_the_end(self):
+        for seed in range(3):
+            sim = self.start(seed)
+            frames = []
+            while not frames or not frames[-1].last:
+                time.sleep(0.01)    # A slow display
+                snapshot = sim.latest(timeout=1)
+                self.assertIsNotNone(snapshot)
+                frames.append(snapshot)
+            sim.join()
+            pop = sim.population
+            self.assertTrue(contagion.quiescent(pop))
+            # Frames come in order and the last is the population as it ends
+            days = [frame.day for frame in frames]
+            self.assertEqual(days, sorted(days))
+            self.assertEqual(frames[-1].day, pop.day)
+            np.testing.assert_array_equal(frames[-1].states, pop.state_grid())
+            self.assertEqual(frames[-1].counts, pop.counts())
+            # Epoch reports are all there, as in a headless run
+            epochs = []
+            while not sim.epochs.empty():
+                epochs.append(sim.epochs.get())
+            expected = list(range(contagion.EPOCH, pop.day + 1, contagion.EPOCH))
+            if pop.day % contagion.EPOCH:
+                expected.append(pop.day)
+            self.assertEqual([report.day for report in epochs], expected)
+            self.assertEqual([report.epoch for report in epochs],
+                             list(range(1, len(expected) + 1)))
+
+    def test_full_queue_drops_oldest(self):
+        sim = simulation.Simulation(None, None, None)
+        for day in range(5):
+            sim.publish(simulation.Snapshot(day, None, {}))
+        self.assertEqual(sim.frames.qsize(), simulation.FRAMES)
+        self.assertEqual(sim.latest().day, 4)
+        self.assertIsNone(sim.latest(timeout=0.01))
+
+    def test_days_end_epochs_and_the_run(self):
+        pop = array_model.ArrayPopulation(12, 12, seed=1)
+        pop.seed()
+        stats = contagion_stats.Stats(pop, chart=False, out=io.StringIO())
+        days = list(simulation.days(pop, stats, contagion.quiescent, epoch_length=4, epoch=2))
+        self.assertTrue(contagion.quiescent(pop))
+        self.assertEqual([day.day for day in days],
+                         list(range(1, pop.day + 1)) + [pop.day])
+        self.assertEqual([day.last for day in days], [False] * pop.day + [True])
+        ends = [day for day in days if day.epoch]
+        expected = list(range(4, pop.day + 1, 4))
+        if pop.day % 4:
+            expected.append(pop.day)
+        self.assertEqual([day.day for day in ends], expected)
+        self.assertEqual([day.epoch for day in ends], list(range(3, 3 + len(expected))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Tests for sweep.py.
+"""
+import io
+import os
+import unittest
+
+import config
+import sweep
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestParseVary(unittest.TestCase):
+
+    def test_list(self):
+        p = sweep.parse_vary("P_Transmit=0.1,0.2")
+        self.assertEqual(p, sweep.Parameter("P_Transmit", None, ["0.1", "0.2"]))
+
+    def test_section(self):
+        p = sweep.parse_vary("Typical.P_Visit=0.5")
+        self.assertEqual(p.section, "Typical")
+        self.assertEqual(p.label, "Typical.P_Visit")
+
+    def test_int_range_is_inclusive(self):
+        self.assertEqual(sweep.parse_vary("T_Recover=3:7:2").values, ["3", "5", "7"])
+
+    def test_float_range_is_inclusive(self):
+        self.assertEqual(sweep.parse_vary("P_Transmit=0.1:0.3:0.1").values,
+                         ["0.1", "0.2", "0.3"])
+
+
+class TestCheck(unittest.TestCase):
+
+    def setUp(self):
+        self.conf = os.path.join(HERE, "contagion.ini")
+
+    def test_known_parameters(self):
+        sweep.check(self.conf, [sweep.parse_vary("P_Visit=0.1,0.9"),
+                                sweep.parse_vary("P_Transmit=0.2"),
+                                sweep.parse_vary("Typical.T_Recover=3")])
+
+    def test_misspelled_parameter(self):
+        for spec in ["P_Vist=0.1,0.9", "Typical.P_Vist=0.1", "Typcal.P_Visit=0.1"]:
+            with self.assertRaises(ValueError):
+                sweep.check(self.conf, [sweep.parse_vary(spec)])
+        self.assertNotIn("P_Vist", config.CONF["Grid"])
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_table_has_row_per_combination(self):
+        parameters = [sweep.parse_vary("P_Transmit=0,1"),
+                      sweep.parse_vary("T_Recover=2")]
+        results = sweep.sweep(os.path.join(HERE, "tiny.ini"), parameters,
+                              replicates=2, workers=1, seed=211)
+        self.assertEqual([point for point, _ in results],
+                         [("0", "2"), ("1", "2")])
+        # Nobody catches anything from patient zero, though
+        # patient zero may die
+        for outcome in results[0][1]:
+            self.assertLessEqual(outcome.deaths, 1)
+            self.assertLessEqual(outcome.peak_symptomatic, 1)
+        out = io.StringIO()
+        sweep.write_table(out, parameters, results)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("P_Transmit,T_Recover,replicates,"))
+
+    def test_same_seed_same_results_with_more_workers(self):
+        parameters = [sweep.parse_vary("P_Transmit=0.5,1")]
+        conf = os.path.join(HERE, "tiny.ini")
+        serial = sweep.sweep(conf, parameters, replicates=3, workers=1, seed=211)
+        parallel = sweep.sweep(conf, parameters, replicates=3, workers=3, seed=211)
+        self.assertEqual(serial, parallel)
+
+
+    def test_curves_from_the_same_runs(self):
+        parameters = [sweep.parse_vary("P_Transmit=0.5,1")]
+        conf = os.path.join(HERE, "tiny.ini")
+        plain = sweep.sweep(conf, parameters, replicates=5, workers=2, seed=7)
+        with_curves = sweep.sweep_curves(conf, parameters, replicates=5, workers=2, seed=7)
+        self.assertEqual(plain, [(point, outcomes) for point, outcomes, _ in with_curves])
+        for _, _, curves in with_curves:
+            self.assertEqual(curves.runs, 5)
+        out = io.StringIO()
+        sweep.write_curves(out, parameters, with_curves)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("P_Transmit,day,state,runs,"))
+        self.assertEqual(len(lines), 1 + sum(curves.days * 5 for _, _, curves in with_curves))
+
+
+if __name__ == "__main__":
+    unittest.main()